@@ -1,19 +1,32 @@
 #!/usr/bin/env python3
 
 import discord
+import asyncio
 import json
+import hashlib
+import heapq
+import gzip
 import re
 import emoji
 from tabulate import tabulate
-from datetime import datetime
+from datetime import datetime, timedelta
+from math import log
 import pytz
 import tzlocal
-from os import get_terminal_size
+from os import get_terminal_size, replace, remove, makedirs, listdir
+from os.path import join, dirname, isfile, isdir
+from html import escape
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat, accumulate
+from collections import Counter
+from threading import RLock
+from array import array
+from bisect import bisect_left
 
 
 version = "1.0.2"
 scan_version = "1.0"        # Increment these when making changes to
-analysis_version = "1.0"    # the structure of scans or analysis
+analysis_version = "2.0"    # the structure of scans or analysis
 
 
 ########
@@ -22,21 +35,44 @@ analysis_version = "1.0"    # the structure of scans or analysis
 
 scan = None
 analysis = None
-update = False
+mode = None
+live_events = None
+live_channels = set()
+live_snapshot = "live"
+report_worker = None        # Analysis and options of a report worker process
+cache_dir = None            # Directory where scans record the raw messages fetched, if set
 always_show = False
 always_reanalyze = False
 table_format = "pretty"
-time_format = "24h"
-repeat_emoji = True
-legacy_replies = True
-timezone = str(tzlocal.get_localzone())
+display = {                 # Display settings of the analysis being viewed
+    "time_format": "24h",
+    "repeat_emoji": True,
+    "legacy_replies": True,
+}
+settings = {                # Analysis settings, stored in each analysis made with them
+    "timezone": str(tzlocal.get_localzone()),
+    "approximate": False,
+}
+sketch_size = 32            # Counters kept per approximate user or emoji metric
+sketch_registers = 64       # Registers of each distinct count estimate
 
 emoji_re = re.compile(r"(?<=<:)[^:\s]+(?=:\d+>)|" + '|'.join(re.escape(e) for e in emoji.UNICODE_EMOJI['en'].keys()))
 
 user_metrics = ["Messages", "Characters\ntyped", "Characters\nper message", "Emoji\nused", "Top\nemoji", "Reactions", "Top\nreaction", "Top overall\nemoji", "Reactions\nreceived", "Top reaction\nreceived", "Mentions", "Times\nmentioned", "Replies", "Times\nreplied to", "Links", "Attachments", "Top attachment\ntype"]
 channel_metrics = ["Messages", "Top message\nsender", "Characters\ntyped", "Top character\ntyper", "Characters\nper message", "Emoji\nused", "Top\nemoji", "Reactions", "Top\nreaction", "Top overall\nemoji", "Mentions", "Top\nmentioner", "Top user\nmentioned", "Replies", "Top\nreplier", "Top\nreplied to", "Links", "Attachments", "Top attachment\ntype", "Top attachment\nsender", "Top link\nsender"]
+user_chart_metrics = ["Messages", "Characters\ntyped", "Characters\nper message", "Emoji\nused", "Reactions", "Reactions\nreceived", "Mentions", "Times\nmentioned", "Replies", "Times\nreplied to", "Links", "Attachments"]
 ranks = ["Message\nsender", "Character\ntyper", "Emoji\nused", "Reaction", "Overall\nemoji", "Mentioner", "Mentioned", "Replier", "Replied\nto", "Link\nsender", "Attachment\nsender", "Attachment\ntype"]
 week_days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+user_sketches = ["emoji", "reactions", "reactions_received", "mentioned_by", "mentions", "replied_to_by", "replies"]
+reverse_fields = {"mentioned_by": "mentions", "replied_to_by": "replies"}   # Counters mirroring others, only stored by approximate analyses
+emoji_sketches = ["in_message", "reactions_given", "reactions_received"]
+channel_counters = ["messages", "chars_typed", "emoji", "reactions", "reactions_received", "mentioned", "mentions", "replied_to", "replies", "attachments", "links"]
+variant_fields = {          # Counters also kept with the setting disabled, under their alternative name
+    "repeat_emoji": ["emoji", "in_message"],
+    "legacy_replies": ["mentioned_by", "mentions", "replied_to_by", "replies", "mentioned", "replied_to"],
+}
+alternatives = {f: f"{f}_without_{s}" for s, fields in variant_fields.items() for f in fields}
+sparse_fields = set(["users"] + user_sketches + emoji_sketches + channel_counters + list(alternatives.values()))
 
 intents = discord.Intents.default()
 intents.members = True
@@ -53,6 +89,13 @@ def increment(d, key, increment=1):
         d[key] = 0
     d[key] += increment
 
+def decrement(d, key, decrement=1):
+    """Decrement a value in a dictionary. Remove the key from the dictionary if its value reaches zero."""
+    if key in d:
+        d[key] -= decrement
+        if d[key] <= 0:
+            del d[key]
+
 def max_value(d):
     """Return the key in the dictionary that corresponds to the largest value."""
     return max(d, key=lambda e: d[e])
@@ -91,6 +134,191 @@ def compress_dict(d):
         res = add_dicts(res, v)
     return res
 
+def merge_counters(d1, d2):
+    """Add the values of `d2` to `d1` in place, merging nested dictionaries and adding lists element-wise. Return `d1`."""
+    for k, v in d2.items():
+        if isinstance(v, dict):
+            merge_counters(d1.setdefault(k, {}), v)
+        elif isinstance(v, list):
+            d1[k] = [a + b for a, b in zip(d1.get(k, [0] * len(v)), v)]
+        else:
+            d1[k] = d1.get(k, 0) + v
+    return d1
+
+def new_sketches(fields):
+    """Return the error bounds, sums and distinct count registers of the approximate counters in `fields`."""
+    return {"errors": {f: {} for f in fields}, "totals": {f: 0 for f in fields}, "distinct": {f: [0] * sketch_registers for f in fields}}
+
+def total(info, field):
+    """Return the sum of the values of a user or emoji counter. Approximate counters keep it apart, since merging them drops keys."""
+    if "totals" in info and field in info["totals"]:
+        return info["totals"][field]
+    return sum(info[field].values())
+
+def count(analysis, info, field, key, n=1):
+    """Increment a user or emoji counter. Approximate counters keep only the `sketch_size` largest values (Space-Saving),
+    and each value overestimates the real one by at most its recorded error."""
+    if "errors" not in info:
+        increment(info[field], key, n)
+        return
+    d, errors = info[field], info["errors"][field]
+    if key not in d:
+        if len(d) >= sketch_size:
+            evicted = min(d, key=d.get)
+            errors.pop(evicted, None)
+            errors[key] = d.pop(evicted)
+            d[key] = errors[key]
+        hll_add(info["distinct"][field], analysis["names"][key])
+    increment(d, key, n)
+    if "totals" in info:
+        info["totals"][field] = info["totals"].get(field, 0) + n
+
+def uncount(info, field, key, n=1):
+    """Decrement a user or emoji counter, forgetting the key if its value reaches zero."""
+    decrement(info[field], key, n)
+    if key not in info[field] and "errors" in info:
+        info["errors"][field].pop(key, None)
+    if "totals" in info and field in info["totals"]:
+        info["totals"][field] = max(0, info["totals"][field] - n)
+
+def fork(info, field):
+    """Start the alternative of a counter in `variant_fields` as a copy of it, if it does not exist yet."""
+    alt = alternatives[field]
+    if alt not in info:
+        info[alt] = dict(info[field])
+        if "errors" in info:
+            info["errors"][alt] = dict(info["errors"][field])
+            info["distinct"][alt] = list(info["distinct"][field])
+            if "totals" in info:
+                info["totals"][alt] = total(info, field)
+
+def count_variant(analysis, info, field, key, n=1, enabled=None):
+    """Count a key in a counter that depends on a setting. With `enabled` set to `True` or `False` it is only counted in the
+    counter or in its alternative, which starts as a copy of the counter the first time their counts differ."""
+    if enabled is not None:
+        fork(info, field)
+    if enabled is not False:
+        count(analysis, info, field, key, n)
+    if enabled is not True and alternatives[field] in info:
+        count(analysis, info, alternatives[field], key, n)
+
+def sketch_error(info, field, key):
+    """Return how much the value of `key` in an approximate counter may differ from the real one."""
+    if "errors" not in info or field not in info["errors"]:
+        return 0
+    if key in info[field]:
+        return info["errors"][field].get(key, 0)
+    return min(info[field].values()) if len(info[field]) >= sketch_size else 0
+
+def label(info, fields, key, names):
+    """Return the name of `key` followed by its error bound if the sum of the counters in `fields` is approximate for it."""
+    error = sum(sketch_error(info, f, key) for f in fields)
+    return f"{names[key]} (±{error})" if error else names[key]
+
+def hll_add(registers, key):
+    """Add a key to a HyperLogLog distinct count estimate."""
+    h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+    bits = len(registers).bit_length() - 1
+    rest = h & ((1 << (64 - bits)) - 1)
+    registers[h >> (64 - bits)] = max(registers[h >> (64 - bits)], 64 - bits - rest.bit_length() + 1)
+
+def hll_estimate(registers):
+    """Return the estimated number of distinct keys added to a HyperLogLog."""
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in registers)
+    if estimate <= 2.5 * m and 0 in registers:
+        estimate = m * log(m / registers.count(0))
+    return round(estimate)
+
+def distinct(info, field):
+    """Return a string with the number of distinct keys in a user or emoji counter."""
+    if "distinct" in info and field in info["distinct"]:
+        return f"~{hll_estimate(info['distinct'][field])} (±{round(104 / len(info['distinct'][field]) ** 0.5)}%)"
+    return str(len(info[field]))
+
+def round_counters(d):
+    """Round the estimated values of a dictionary in place, including the ones in nested dictionaries."""
+    for k, v in d.items():
+        if isinstance(v, dict):
+            round_counters(v)
+        elif isinstance(v, list):
+            d[k] = [round(x) if isinstance(x, float) else x for x in v]
+        elif isinstance(v, float):
+            d[k] = round(v)
+
+def build_graph(counters, size):
+    """Return the graph of who mentions or replies to whom, given the counter of each user index in `counters`, in sparse
+    (CSR) form: the edges of user `u` go to `indices[indptr[u]:indptr[u+1]]`, in increasing order, with their counts in `weights`."""
+    indptr, indices, weights = array("q", [0]), array("q"), []
+    for u in range(size):
+        edges = counters.get(u, {})
+        for v in sorted(edges):
+            indices.append(v)
+            weights.append(edges[v])
+        indptr.append(len(indices))
+    typecode = "q" if all(isinstance(w, int) for w in weights) else "d"
+    return {"indptr": indptr, "indices": indices, "weights": array(typecode, weights)}
+
+def transpose_graph(graph):
+    """Return a graph with the edges of `graph` reversed, such as who each user was mentioned by."""
+    indptr, indices, weights = graph["indptr"], graph["indices"], graph["weights"]
+    size = len(indptr) - 1
+    counts = [0] * (size + 1)
+    for v in indices:
+        counts[v + 1] += 1
+    reversed_indptr = array("q", accumulate(counts))
+    reversed_indices, reversed_weights = array("q", [0]) * len(indices), array(weights.typecode, [0]) * len(weights)
+    position = list(reversed_indptr[:-1])
+    for u in range(size):
+        for i in range(indptr[u], indptr[u + 1]):
+            v = indices[i]
+            reversed_indices[position[v]] = u
+            reversed_weights[position[v]] = weights[i]
+            position[v] += 1
+    return {"indptr": reversed_indptr, "indices": reversed_indices, "weights": reversed_weights}
+
+def neighbors(graph, u):
+    """Return the users a user has edges to in a graph and their counts."""
+    if u >= len(graph["indptr"]) - 1:
+        return {}
+    lo, hi = graph["indptr"][u], graph["indptr"][u + 1]
+    return dict(zip(graph["indices"][lo:hi], graph["weights"][lo:hi]))
+
+def edge_weight(graph, u, v):
+    """Return the count of the edge from `u` to `v` in a graph, or 0 if there is none."""
+    if u >= len(graph["indptr"]) - 1:
+        return 0
+    lo, hi = graph["indptr"][u], graph["indptr"][u + 1]
+    i = bisect_left(graph["indices"], v, lo, hi)
+    return graph["weights"][i] if i < hi and graph["indices"][i] == v else 0
+
+def edge_list(graph):
+    """Yield the source, target and count of every edge of a graph."""
+    indptr, indices, weights = graph["indptr"], graph["indices"], graph["weights"]
+    for u in range(len(indptr) - 1):
+        for i in range(indptr[u], indptr[u + 1]):
+            yield u, indices[i], weights[i]
+
+def degree(graph, u):
+    """Return the number of users a user has edges to in a graph."""
+    return graph["indptr"][u + 1] - graph["indptr"][u] if u < len(graph["indptr"]) - 1 else 0
+
+def input_int(default=None, minimum=None):
+    """Read an integer, at least `minimum` if given, from the user. Return `default` if nothing is entered."""
+    while True:
+        ans = input("> ")
+        if not ans and default is not None:
+            return default
+        try:
+            n = int(ans)
+        except ValueError:
+            print("Invalid number")
+            continue
+        if minimum is not None and n < minimum:
+            print(f"The number must be at least {minimum}")
+        else:
+            return n
+
 def select(options, key=None):
     """Display a menu with the options given and return the option selected."""
 
@@ -139,6 +367,77 @@ def multi_select(options):
     print()
     return list(filter_list(options, indexes))
 
+async def get_reactions(message):
+    """Return the names of the users who reacted to a message with each emoji."""
+    reactions = {}
+    for r in message.reactions:
+        emoji = r.emoji if type(r.emoji) is str else r.emoji.name
+        reactions[emoji] = [user.name async for user in r.users()]
+    return reactions
+
+async def parse_message(message, cache=None):
+    """Return the relevant information of a message in the format stored in scans. The raw message is also written to
+    the `cache` file if one is given."""
+    raw = await raw_message(message)
+    if cache:
+        cache.write(json.dumps(raw) + "\n")
+    return extract_features(raw)
+
+async def raw_message(message, reactions=None):
+    """Return the fields of a message that scans are extracted from, as stored in the raw message cache. The users who
+    reacted to it are fetched unless its `reactions` are given."""
+    replying_to = ""
+    try: replying_to = message.reference.resolved.author.name
+    except: pass
+    return {
+        "id": message.id,
+        "created_at": str(message.created_at),
+        "author": message.author.name,
+        "content": message.content,
+        "clean_content": message.clean_content,
+        "mentions": [user.name for user in message.mentions],
+        "replying_to": replying_to,
+        "attachments": [{"filename": a.filename, "content_type": a.content_type} for a in message.attachments],
+        "reactions": await get_reactions(message) if reactions is None else reactions,
+    }
+
+def extract_features(raw):
+    """Return the relevant information of a raw message in the format stored in scans."""
+
+    # Replies
+    replying_to = raw["replying_to"]
+    
+    # Mentions
+    mentions = list(raw["mentions"])
+    if replying_to in mentions:
+        mentions.remove(replying_to)
+
+    # Content
+    content = raw["clean_content"]
+
+    # Attachments
+    attachments = []
+    for a in raw["attachments"]:
+        if a["content_type"]:
+            attachments.append(a["content_type"].split("/")[0])
+
+    # Links
+    links = re.findall(r"https?:\/\/[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b[-a-zA-Z0-9()@:%_\+.~#?&//=]*", content)
+    for l in links:
+        content = content.replace(l, "")
+
+    return {
+        "timestamp": raw["created_at"],
+        "author": raw["author"],
+        "content": re.sub(r"<(:[^:\s]+:)\d+>", r"\1", content),
+        "emoji": re.findall(emoji_re, content),
+        "reactions": raw["reactions"],
+        "mentions": mentions,
+        "replying_to": replying_to,
+        "attachments": attachments,
+        "links": links,
+    }
+
 async def scan_server(server, update=False):
     """Save relevant information from all the messages in the selected channels."""
 
@@ -150,215 +449,773 @@ async def scan_server(server, update=False):
     print("\nSelect a channel:")
     channels = multi_select(server.text_channels)
 
+    print("Select scan mode:")
+    sampled = select(["Full scan", "Sampled scan (estimated counts)"]) != "Full scan"
+    if sampled:
+        print("Enter number of sampling windows per channel (default: 20)")
+        windows = input_int(20, minimum=1)
+        print("Enter number of messages per window (default: 500)")
+        window_size = input_int(500, minimum=1)
+
+    cached = read_cache_info(join(cache_dir, str(server.id))) if cache_dir else None
+    complete = {id for id, info in (cached or {}).get("channels", {}).items() if info["complete"] and id in scan["channels"]}
+
     for i, channel in enumerate(channels):
         id = str(channel.id)
-        if (id) not in scan["channels"]:
+        reset = (id) not in scan["channels"] or sampled or "sample_windows" in scan["channels"][id]
+        if reset:
             scan["channels"][id] = {"name": channel.name, "last_scanned_message": "", "messages": []}
     
         print("Scanning messages from:", channel.name, f"[{i+1}/{len(channels)}]", " ")
 
-        last = scan["channels"][id]["last_scanned_message"]
-        last = datetime.fromisoformat(last) if last else ""
-        new_last = last
+        cache = open_cache(server, channel, reset) if cache_dir else None
+        if reset:
+            complete.add(id)
+        try:
+            await scan_channel(channel, scan["channels"][id], cache, (windows, window_size) if sampled else None)
+        finally:
+            if cache:
+                cache.close()
+    
+    for r in server.roles:
+        scan["roles"][r.name] = [user.name for user in r.members]
+
+    if cache_dir:
+        write_cache_info(scan, complete)
+    
+    await client.close()
+
+async def scan_channel(channel, info, cache=None, sampling=None):
+    """Scan the messages of a channel sent since the last scan, or sample them if `sampling` gives the number of
+    windows and messages per window. Messages already recorded by a live analysis since the last scan are not added again."""
 
-        now = datetime.now()
-        age = now - (last if last else channel.created_at)
+    if sampling:
+        await sample_channel(channel, info, *sampling, cache)
+        return
 
-        async for message in channel.history(limit=None, oldest_first=False):
-            if last and last >= message.created_at:
-                break
+    last = info["last_scanned_message"]
+    recorded = {(m["timestamp"], m["author"]) for m in info["messages"] if m["timestamp"] > last}
+    last = datetime.fromisoformat(last) if last else ""
+    new_last = last
 
-            print(str(message.created_at)[:-3], f"({round((now - message.created_at)/age * 100, 1)}%)", end="\r")
+    now = datetime.now()
+    age = now - (last if last else channel.created_at)
 
-            if not new_last or message.created_at > new_last:
-                new_last = message.created_at
+    async for message in channel.history(limit=None, oldest_first=False):
+        if last and last >= message.created_at:
+            break
 
-            # Reactions
-            reactions = {}
-            for r in message.reactions:
-                emoji = r.emoji if type(r.emoji) is str else r.emoji.name
-                reactions[emoji] = [user.name async for user in r.users()]
+        print(str(message.created_at)[:-3], f"({round((now - message.created_at)/age * 100, 1)}%)", end="\r")
 
-            # Replies
-            replying_to = ""
-            try: replying_to = message.reference.resolved.author.name
-            except: pass
-            
-            # Mentions
-            mentions = [user.name for user in message.mentions]
-            if replying_to in mentions:
-                mentions.remove(replying_to)
-
-            # Content
-            content = message.clean_content
-
-            # Attachments
-            attachments = []
-            if message.attachments:
-                for a in message.attachments:
-                    if a.content_type:
-                        attachments.append(a.content_type.split("/")[0])
-
-            # Links
-            links = re.findall(r"https?:\/\/[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b[-a-zA-Z0-9()@:%_\+.~#?&//=]*", content)
-            for l in links:
-                content = content.replace(l, "")
-
-            scan["channels"][id]["messages"].append({
-                "timestamp": str(message.created_at),
-                "author": message.author.name,
-                "content": re.sub(r"<(:[^:\s]+:)\d+>", r"\1", content),
-                "emoji": re.findall(emoji_re, content),
-                "reactions": reactions,
-                "mentions": mentions,
-                "replying_to": replying_to,
-                "attachments": attachments,
-                "links": links,
-            })
-        
-        scan["channels"][id]["last_scanned_message"] = str(new_last)
-        
-    
-    for r in server.roles:
-        scan["roles"][r.name] = [user.name for user in r.members]
+        if not new_last or message.created_at > new_last:
+            new_last = message.created_at
+
+        if (str(message.created_at), message.author.name) in recorded:
+            continue
+        info["messages"].append(await parse_message(message, cache))
     
+    info["last_scanned_message"] = str(new_last)
+
+async def sample_channel(channel, info, windows, window_size, cache=None):
+    """Scan up to `window_size` messages from each of `windows` evenly spaced periods of the channel history,
+    recording which fraction of each period was covered."""
+    start = channel.created_at
+    step = (datetime.utcnow() - start) / windows
+    info["sample_windows"] = []
+    for w in range(windows):
+        after, before = start + w * step, start + (w + 1) * step
+        print(f"{after:%Y-%m-%d}", f"({round(w / windows * 100, 1)}%)", end="\r")
+        last = None
+        n = 0
+        async for message in channel.history(limit=window_size, after=after, before=before, oldest_first=True):
+            info["messages"].append(await parse_message(message, cache))
+            last = message.created_at
+            n += 1
+        ratio = max((last - after) / step, 1e-6) if n == window_size else 1
+        info["sample_windows"].append({"after": str(after), "before": str(before), "ratio": ratio})
+        if last and str(last) > info["last_scanned_message"]:
+            info["last_scanned_message"] = str(last)
+    info["sample_ratio"] = sum(w["ratio"] for w in info["sample_windows"]) / windows
+
+def open_cache(server, channel, reset):
+    """Open the raw message cache of a channel to add the messages scanned, emptying it first if the channel is scanned from scratch."""
+    path = join(cache_dir, str(server.id), f"{channel.id}.jsonl.gz")
+    makedirs(dirname(path), exist_ok=True)
+    return gzip.open(path, "wt" if reset else "at", encoding="utf-8")
+
+def write_cache_info(scan, complete):
+    """Write the parts of a scan that are not in the raw message cache of its channels: the server, its roles and members,
+    and the state of each channel scan. Channels in `complete` have all their scanned messages cached."""
+    channels = {id: {**filter_dict(info, set(info) - {"messages"}), "complete": id in complete} for id, info in scan["channels"].items()}
+    try:
+        with gzip.open(join(cache_dir, str(scan["server"]["id"]), "server.json.gz"), "wt", encoding="utf-8") as file:
+            json.dump({"version": scan_version, "server": scan["server"], "roles": scan["roles"], "channels": channels}, file)
+    except OSError as e:
+        print(e)
+
+def read_cache_info(directory):
+    """Return the scan information stored in the raw message cache of a server, or `None` if there is none."""
+    try:
+        with gzip.open(join(directory, "server.json.gz"), "rt", encoding="utf-8") as file:
+            return json.load(file)
+    except OSError:
+        return None
+
+def rebuild_channel(path):
+    """Return the scan messages of a channel extracted again from its raw message cache. Messages cached more than once keep their last record."""
+    records = {}
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        for line in file:
+            raw = json.loads(line)
+            records[raw["id"]] = raw
+    return [extract_features(raw) for raw in records.values()]
+
+def rebuild_scan(directory):
+    """Return the scan of a server made again from its raw message cache, extracting the messages of the channels in parallel."""
+    info = read_cache_info(directory)
+    if not info:
+        print(f"No raw message cache found in '{directory}'")
+        return None
+    channels = {}
+    for id, c in info["channels"].items():
+        if c.pop("complete") and isfile(join(directory, f"{id}.jsonl.gz")):
+            channels[id] = c
+        else:
+            print(f"Skipping '{c['name']}': not all its messages were cached")
+    with ProcessPoolExecutor() as executor:
+        messages = list(executor.map(rebuild_channel, [join(directory, f"{id}.jsonl.gz") for id in channels]))
+    scan = {"version": scan_version, "server": info["server"], "channels": {}, "roles": info["roles"]}
+    for (id, c), m in zip(channels.items(), messages):
+        scan["channels"][id] = {**c, "messages": m}
+    return scan
+
+async def refresh_reactions(server):
+    """Fetch again the reactions of the scanned messages sent in the last days and apply the changes to the scan and analysis.
+    The messages whose reactions changed are also added again to the raw message cache, where their last record is kept."""
+
+    print("Enter number of days to refresh (default: 7)")
+    since = datetime.utcnow() - timedelta(days=input_int(7))
+    changes = 0
+
+    for i, (id, info) in enumerate(scan["channels"].items()):
+        channel = server.get_channel(int(id))
+        if not channel:
+            continue
+        print("Refreshing reactions from:", info["name"], f"[{i+1}/{len(scan['channels'])}]", " ")
+
+        messages = {(m["timestamp"], m["author"]): m for m in info["messages"] if m["timestamp"] > str(since)}
+        windows = info.get("sample_windows", [])
+        cache = open_cache(server, channel, False) if cache_dir else None
+        try:
+            async for message in channel.history(limit=None, after=since):
+                m = messages.get((str(message.created_at), message.author.name))
+                if m:
+                    raw = await raw_message(message)
+                    change = analysis.update(diff_reactions, info["name"], m, raw["reactions"], sample_weight(windows, m["timestamp"]))
+                    if change and cache:
+                        cache.write(json.dumps(raw) + "\n")
+                    changes += change
+        finally:
+            if cache:
+                cache.close()
+
+    if analysis.data.get("estimated"):
+        analysis.update(round_counters)
+    print(f"Applied {changes} reaction changes", " "*16)
     await client.close()
 
-def analyze_scan():
-    """Read all messages from scan and count relevant metrics."""
+async def live_server(server):
+    """Update the analysis, and the scan if there is one, with the events of the selected channels until interrupted."""
 
-    global scan
+    global analysis, live_events, live_channels, live_snapshot
 
-    users = {}
-    channels = {}
-    emoji = {}
-    server = {"name": scan["server"]["name"], "messages": {}, "chars_typed": {}, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentioned": {}, "mentions": {}, "replied_to": {}, "replies": {}, "attachments": {}, "links": {}, "active_hours": {f"{h}h": 0 for h in range(24)}, "active_days": {week_days[d]: 0 for d in range(7)}}
+    if not analysis or analysis.data["server"]["name"] != server.name:
+        data = analyze_scan(scan, settings) if scan else new_analysis(server.name, {r.name: [user.name for user in r.members] for r in server.roles}, settings)
+        analysis = Analysis(data, **display)
 
-    def init_user(name):
-        if name not in users:
-            users[name] = {"messages": 0, "chars_typed": 0, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentioned_by": {}, "mentions": {}, "replied_to_by": {}, "replies": {}, "attachments": {}, "links": 0, "active_hours": {f"{h}h": 0 for h in range(24)}, "active_days": {week_days[d]: 0 for d in range(7)}}
+    print("\nSelect a channel:")
+    live_channels = {str(c.id) for c in multi_select(server.text_channels)}
+
+    print("Enter snapshot name (default: 'live')")
+    live_snapshot = input("> ") or "live"
+    print("Enter snapshot interval in seconds (default: 60)")
+    interval = input_int(60, minimum=1)
+
+    live_events = asyncio.Queue()
+    print("Listening for events (press Ctrl+C to stop)...")
+    await live_analysis(queue_events(live_events), analysis, scan, interval, live_snapshot)
+
+def new_analysis(name, roles, settings):
+    """Return an analysis of a server without any messages, made with the analysis `settings` given. User names and emoji
+    are stored once in the `names` table and referred to by their index everywhere else."""
+    server = {"name": name, "messages": {}, "chars_typed": {}, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentioned": {}, "mentions": {}, "replied_to": {}, "replies": {}, "attachments": {}, "links": {}, "active_hours": [0] * 24, "active_days": [0] * 7}
+    analysis = {"version": analysis_version, **settings, "variants": True, "names": [], "ids": {}, "users": {}, "channels": {}, "emoji": {}, "server": server, "roles": {}}
+    analysis["roles"] = {r: [intern(analysis, name) for name in members] for r, members in roles.items()}
+    return analysis
+
+def intern(analysis, name):
+    """Return the index of a user name or emoji in the `names` table of the analysis, adding it if needed."""
+    if name not in analysis["ids"]:
+        analysis["ids"][name] = len(analysis["names"])
+        analysis["names"].append(name)
+    return analysis["ids"][name]
+
+def init_user(analysis, name):
+    """Add a user to the analysis if needed and return its index."""
+    id = intern(analysis, name)
+    if id not in analysis["users"]:
+        analysis["users"][id] = {"messages": 0, "chars_typed": 0, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentions": {}, "replies": {}, "attachments": {}, "links": 0, "active_hours": [0] * 24, "active_days": [0] * 7}
+        if analysis.get("approximate"):
+            analysis["users"][id].update({f: {} for f in reverse_fields}, **new_sketches(user_sketches))
+    return id
+
+def init_channel(analysis, channel):
+    if channel not in analysis["channels"]:
+        analysis["channels"][channel] = {"messages": {}, "chars_typed": {}, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentioned": {}, "mentions": {}, "replied_to": {}, "replies": {}, "attachments": {}, "links": {}, "active_hours": [0] * 24, "active_days": [0] * 7}
+
+def init_emoji(analysis, e):
+    """Add an emoji to the analysis if needed and return its index."""
+    id = intern(analysis, e)
+    if id not in analysis["emoji"]:
+        analysis["emoji"][id] = {"in_message": {}, "reactions_given": {}, "reactions_received": {}}
+        if analysis.get("approximate"):
+            analysis["emoji"][id].update(new_sketches(emoji_sketches))
+    return id
+
+def analyze_reaction(analysis, channel, author, e, name, remove=False, weight=1):
+    """Count a reaction with emoji `e` given by `name` to a message sent by `author`, or discount it if `remove` is set."""
+    users, emoji = analysis["users"], analysis["emoji"]
+    e = init_emoji(analysis, e)
+    name = init_user(analysis, name)
+    author = init_user(analysis, author)
+    if remove:
+        decrement(analysis["channels"][channel]["reactions"], e, weight)
+        decrement(analysis["server"]["reactions"], e, weight)
+    else:
+        increment(analysis["channels"][channel]["reactions"], e, weight)
+        increment(analysis["server"]["reactions"], e, weight)
+    for info, field, key in ((users[name], "reactions", e), (emoji[e], "reactions_given", name), (emoji[e], "reactions_received", author), (users[author], "reactions_received", e)):
+        if remove:
+            uncount(info, field, key, weight)
+        else:
+            count(analysis, info, field, key, weight)
+
+def analyze_message(analysis, channel, message, weight=1):
+    """Count the relevant metrics of a scanned message sent in `channel`. Sampled messages are counted `weight` times."""
+
+    users, channels, emoji, server = analysis["users"], analysis["channels"], analysis["emoji"], analysis["server"]
+    init_channel(analysis, channel)
+
+    author = init_user(analysis, message["author"])
+
+    # Messages and links
+    increment(channels[channel]["messages"], author, weight)
+    increment(server["messages"], author, weight)
+    increment(channels[channel]["chars_typed"], author, len(message["content"]) * weight)
+    increment(server["chars_typed"], author, len(message["content"]) * weight)
+    if message["links"]:
+        increment(channels[channel]["links"], author, len(message["links"]) * weight)
+        increment(server["links"], author, len(message["links"]) * weight)
+    users[author]["messages"] += weight
+    users[author]["chars_typed"] += len(message["content"]) * weight
+    users[author]["links"] += len(message["links"]) * weight
+
+    # Emoji, repeated ones only counted once without `repeat_emoji`
+    for e, n in Counter(message["emoji"]).items():
+        e = init_emoji(analysis, e)
+        for info, field, key in ((users[author], "emoji", e), (channels[channel], "emoji", e), (server, "emoji", e), (emoji[e], "in_message", author)):
+            count_variant(analysis, info, field, key, weight)
+            if n > 1:
+                count_variant(analysis, info, field, key, (n - 1) * weight, enabled=True)
     
-    def init_channel(channel):
-        if channel not in channels:
-            channels[channel] = {"messages": {}, "chars_typed": {}, "emoji": {}, "reactions": {}, "reactions_received": {}, "mentioned": {}, "mentions": {}, "replied_to": {}, "replies": {}, "attachments": {}, "links": {}, "active_hours": {f"{h}h": 0 for h in range(24)}, "active_days": {week_days[d]: 0 for d in range(7)}}
+    # Reactions
+    for e in message["reactions"]:
+        for name in message["reactions"][e]:
+            analyze_reaction(analysis, channel, message["author"], e, name, weight=weight)
     
-    def init_emoji(e):
-        if e not in emoji:
-            emoji[e] = {"in_message": {}, "reactions_given": {}, "reactions_received": {}}
-
+    # Legacy replies, only counted with `legacy_replies`
+    mentions = set(message["mentions"])
+    replied_to = None
+    if message["mentions"] and not message["replying_to"] and message["content"].startswith("> "):
+        for l in message["content"].split("\n"):
+            if l.startswith("> "):
+                for m in message["mentions"]:
+                    if re.search(f"(?<!`)@{re.escape(m)}(?!`)", l):
+                        mentions.discard(m)
+            else: break
+        for m in message["mentions"]:
+            if l.startswith(f"@{m}"):
+                replied_to = m
+                if m in mentions:
+                    mentions.remove(m)
+                break
+        for l in message["content"].split("\n"):
+            if not l.startswith("> "):
+                for m in message["mentions"]:
+                    if m != replied_to and re.search(f"(?<!`)@{re.escape(m)}(?!`)", l):
+                        mentions.add(m)
+
+    # Mentions
+    for name in mentions | set(message["mentions"]):
+        enabled = None if name in mentions and name in message["mentions"] else name in mentions
+        name = init_user(analysis, name)
+        count_variant(analysis, channels[channel], "mentioned", name, weight, enabled)
+        count_variant(analysis, server, "mentioned", name, weight, enabled)
+        if "mentioned_by" in users[name]:
+            count_variant(analysis, users[name], "mentioned_by", author, weight, enabled)
+        count_variant(analysis, channels[channel], "mentions", author, weight, enabled)
+        count_variant(analysis, server, "mentions", author, weight, enabled)
+        count_variant(analysis, users[author], "mentions", name, weight, enabled)
+    
+    # Replies
+    name = message["replying_to"] if message["replying_to"] else replied_to
+    if name:
+        enabled = None if message["replying_to"] else True
+        name = init_user(analysis, name)
+        count_variant(analysis, channels[channel], "replied_to", name, weight, enabled)
+        count_variant(analysis, server, "replied_to", name, weight, enabled)
+        if "replied_to_by" in users[name]:
+            count_variant(analysis, users[name], "replied_to_by", author, weight, enabled)
+        count_variant(analysis, channels[channel], "replies", author, weight, enabled)
+        count_variant(analysis, server, "replies", author, weight, enabled)
+        count_variant(analysis, users[author], "replies", name, weight, enabled)
+    
+    # Attachments
+    for type in message["attachments"]:
+        if not author in channels[channel]["attachments"]:
+            channels[channel]["attachments"][author] = {}
+        if not author in server["attachments"]:
+            server["attachments"][author] = {}
+        increment(channels[channel]["attachments"][author], type, weight)
+        increment(server["attachments"][author], type, weight)
+        increment(users[author]["attachments"], type, weight)
+    
+    # Time
+    t = datetime.astimezone(pytz.utc.localize(datetime.fromisoformat(message["timestamp"])), pytz.timezone(analysis["timezone"]))
+    channels[channel]["active_hours"][t.hour] += weight
+    server["active_hours"][t.hour] += weight
+    users[author]["active_hours"][t.hour] += weight
+    channels[channel]["active_days"][t.weekday()] += weight
+    server["active_days"][t.weekday()] += weight
+    users[author]["active_days"][t.weekday()] += weight
+
+def sample_weight(windows, timestamp):
+    """Return how many messages a message scanned at `timestamp` stands for, given the sampling windows of its channel."""
+    for w in windows:
+        if w["after"] < timestamp < w["before"]:
+            return 1 / w["ratio"]
+    return 1
+
+def analyze_scan(scan, settings):
+    """Read all messages from scan, count relevant metrics and return the analysis.
+    Counts of sampled channels are scaled to estimate the totals of the whole channel."""
+    analysis = new_analysis(scan["server"]["name"], scan["roles"], settings)
     for id in scan["channels"]:
-        channel = scan["channels"][id]["name"]
-        init_channel(channel)
+        analyze_channel(analysis, scan["channels"][id])
+    if analysis.get("estimated"):
+        round_counters(analysis)
+    return analysis
+
+def analyze_channel(analysis, info):
+    """Count the relevant metrics of the messages of a scanned channel."""
+    channel = info["name"]
+    windows = info.get("sample_windows", [])
+    init_channel(analysis, channel)
+    for message in info["messages"]:
+        analyze_message(analysis, channel, message, sample_weight(windows, message["timestamp"]))
+    if windows:
+        analysis["estimated"] = True
+
+def apply_event(analysis, event):
+    """Apply a live message or reaction event to the analysis counters."""
+    if event["type"] == "message":
+        analyze_message(analysis, event["channel"], event["message"])
+    elif event["type"] in ("reaction_add", "reaction_remove"):
+        init_channel(analysis, event["channel"])
+        analyze_reaction(analysis, event["channel"], event["author"], event["emoji"], event["user"], remove=event["type"] == "reaction_remove")
+
+def record_event(scan, event, messages):
+    """Apply a live event to the scan and return whether it changed it. Reactions are recorded on the scanned message
+    with the timestamp and author of the event, and `messages` maps the ids of the messages found or recorded live to
+    their scan entry, or to `None` if they are not in the scan.
+    The last scanned message of the channel is left as is, so that the next update scan still fetches the messages sent
+    before the live analysis started."""
+    if event["channel_id"] not in scan["channels"]:
+        scan["channels"][event["channel_id"]] = {"name": event["channel"], "last_scanned_message": "", "messages": []}
+    channel = scan["channels"][event["channel_id"]]
+    if event["type"] == "message":
+        messages[event["id"]] = event["message"]
+        channel["messages"].append(event["message"])
+        return True
+    if event["id"] not in messages:
+        key = (event.get("timestamp"), event["author"])
+        messages[event["id"]] = next((m for m in channel["messages"] if (m["timestamp"], m["author"]) == key), None)
+    if not messages[event["id"]]:
+        return False
+    reactions = messages[event["id"]]["reactions"]
+    if event["type"] == "reaction_add":
+        if event["user"] in reactions.get(event["emoji"], []):
+            return False
+        reactions.setdefault(event["emoji"], []).append(event["user"])
+        return True
+    if event["user"] not in reactions.get(event["emoji"], []):
+        return False
+    reactions[event["emoji"]].remove(event["user"])
+    if not reactions[event["emoji"]]:
+        del reactions[event["emoji"]]
+    return True
+
+def diff_reactions(analysis, channel, message, reactions, weight=1):
+    """Replace the reactions of a scanned message, applying only the added and removed ones to the analysis. Return the number of changes."""
+    changes = 0
+    for e in set(message["reactions"]) | set(reactions):
+        old, new = set(message["reactions"].get(e, [])), set(reactions.get(e, []))
+        for name in new - old:
+            analyze_reaction(analysis, channel, message["author"], e, name, weight=weight)
+        for name in old - new:
+            analyze_reaction(analysis, channel, message["author"], e, name, remove=True, weight=weight)
+        changes += len(new ^ old)
+    message["reactions"] = reactions
+    return changes
+
+def cache_event(scan, event, messages, reset=False):
+    """Add the message recorded or changed by a live event to the raw message cache of its channel, emptying it first if
+    `reset` is set. Reaction events carry the message without its reactions, which are taken from the scan."""
+    raw = event["raw"]
+    if event["type"] != "message":
+        raw = {**raw, "reactions": messages[event["id"]]["reactions"]}
+    path = join(cache_dir, str(scan["server"]["id"]), f"{event['channel_id']}.jsonl.gz")
+    try:
+        makedirs(dirname(path), exist_ok=True)
+        with gzip.open(path, "wt" if reset else "at", encoding="utf-8") as file:
+            file.write(json.dumps(raw) + "\n")
+    except OSError as e:
+        print(e)
 
-        for message in scan["channels"][id]["messages"]:
-            global analysis
-            
-            author = message["author"]
-            init_user(author)
-
-            # Messages and links
-            increment(channels[channel]["messages"], author)
-            increment(server["messages"], author)
-            increment(channels[channel]["chars_typed"], author, len(message["content"]))
-            increment(server["chars_typed"], author, len(message["content"]))
-            if message["links"]:
-                increment(channels[channel]["links"], author, len(message["links"]))
-                increment(server["links"], author, len(message["links"]))
-            users[author]["messages"] += 1
-            users[author]["chars_typed"] += len(message["content"])
-            users[author]["links"] += len(message["links"])
-
-            # Emoji
-            for e in (message["emoji"] if repeat_emoji else set(message["emoji"])):
-                increment(users[author]["emoji"], e)
-                increment(channels[channel]["emoji"], e)
-                increment(server["emoji"], e)
-                init_emoji(e)
-                increment(emoji[e]["in_message"], author)
-            
-            # Reactions
-            for e in message["reactions"]:
-                init_emoji(e)
-                for name in message["reactions"][e]:
-                    init_user(name)
-                    increment(users[name]["reactions"], e)
-                    increment(channels[channel]["reactions"], e)
-                    increment(server["reactions"], e)
-                    increment(emoji[e]["reactions_given"], name)
-                    increment(emoji[e]["reactions_received"], author)
-                    increment(users[author]["reactions_received"], e)
-            
-            # Legacy replies
-            mentions = set(message["mentions"])
-            replied_to = None
-            if legacy_replies and message["mentions"] and not message["replying_to"] and message["content"].startswith("> "):
-                for l in message["content"].split("\n"):
-                    if l.startswith("> "):
-                        for m in message["mentions"]:
-                            if re.search(f"(?<!`)@{m}(?!`)", l):
-                                pass
-                                mentions.remove(m)
-                    else: break
-                for m in message["mentions"]:
-                    if l.startswith(f"@{m}"):
-                        replied_to = m
-                        if m in mentions:
-                            mentions.remove(m)
-                        break
-                for l in message["content"].split("\n"):
-                    if not l.startswith("> "):
-                        for m in message["mentions"]:
-                            if m != replied_to and re.search(f"(?<!`)@{m}(?!`)", l):
-                                mentions.add(m)
-
-            # Mentions
-            for name in mentions:
-                init_user(name)
-                increment(channels[channel]["mentioned"], name)
-                increment(server["mentioned"], name)
-                increment(users[name]["mentioned_by"], author)
-                increment(channels[channel]["mentions"], author)
-                increment(server["mentions"], author)
-                increment(users[author]["mentions"], name)
-            
-            # Replies
-            name = message["replying_to"] if message["replying_to"] else replied_to
-            if name:
-                init_user(name)
-                increment(channels[channel]["replied_to"], name)
-                increment(server["replied_to"], name)
-                increment(users[name]["replied_to_by"], author)
-                increment(channels[channel]["replies"], author)
-                increment(server["replies"], author)
-                increment(users[author]["replies"], name)
-            
-            # Attachments
-            for type in message["attachments"]:
-                if not author in channels[channel]["attachments"]:
-                    channels[channel]["attachments"][author] = {}
-                if not author in server["attachments"]:
-                    server["attachments"][author] = {}
-                increment(channels[channel]["attachments"][author], type)
-                increment(server["attachments"][author], type)
-                increment(users[author]["attachments"], type)
-            
-            # Time
-            t = datetime.astimezone(pytz.utc.localize(datetime.fromisoformat(message["timestamp"])), pytz.timezone(timezone))
-            increment(channels[channel]["active_hours"], f"{t.hour}h")
-            increment(server["active_hours"], f"{t.hour}h")
-            increment(users[author]["active_hours"], f"{t.hour}h")
-            increment(channels[channel]["active_days"], week_days[t.weekday()])
-            increment(server["active_days"], week_days[t.weekday()])
-            increment(users[author]["active_days"], week_days[t.weekday()])
-        
-    analysis = {"version": analysis_version, "timezone": timezone, "users": users, "channels": channels, "emoji": emoji, "server": server, "roles": scan["roles"]}
+def cache_live_channels(scan, created):
+    """Mark the channels added to the scan by live events as complete in the raw message cache, as all their messages were cached live."""
+    cached = read_cache_info(join(cache_dir, str(scan["server"]["id"])))
+    complete = {id for id, info in (cached or {}).get("channels", {}).items() if info["complete"] and id in scan["channels"]}
+    write_cache_info(scan, complete | created)
+
+def export_snapshot(analysis, scan, filename):
+    """Export the `Analysis`, and the scan if there is one, with the name given."""
+    with analysis.lock:
+        export_analysis(analysis.data, f"{filename}_analysis.json")
+        if scan:
+            export(scan, f"{filename}_scan.json")
+
+async def queue_events(queue):
+    """Yield the events put in an `asyncio.Queue`."""
+    while True:
+        yield await queue.get()
+
+async def live_analysis(events, analysis, scan=None, interval=60, filename="live"):
+    """Apply the events from an asynchronous iterable to an `Analysis` as they arrive, exporting a snapshot every `interval` seconds
+    if it changed, even while no events arrive, and when the events end. With a scan, events are only applied to the
+    analysis if they change the scan, so that reactions to messages that are not in the scan are ignored and the analysis
+    stays that of the scan. If a raw message cache directory is set, the messages of the events that change the scan are also cached."""
+    messages = {}
+    created, uncached = set(), set()
+    caching = bool(cache_dir and scan and scan["server"].get("id"))
+    changed = False
+
+    def snapshot():
+        export_snapshot(analysis, scan, filename)
+        if caching:
+            cache_live_channels(scan, created)
+
+    async def flush():
+        nonlocal changed
+        while True:
+            await asyncio.sleep(interval)
+            if changed:
+                changed = False
+                snapshot()
+
+    flusher = asyncio.create_task(flush())
+    try:
+        async for event in events:
+            with analysis.lock:
+                if scan and event["channel_id"] not in scan["channels"]:
+                    created.add(event["channel_id"])
+                    uncached.add(event["channel_id"])
+                if not scan or record_event(scan, event, messages):
+                    analysis.update(apply_event, event)
+                    changed = True
+                    if caching and "raw" in event:
+                        cache_event(scan, event, messages, reset=event["channel_id"] in uncached)
+                        uncached.discard(event["channel_id"])
+    finally:
+        flusher.cancel()
+    snapshot()
+
+def merge_analyses(analyses):
+    """Return an analysis combining the users, channels, emoji and server counters of several analyses. Channels are tagged with their server name."""
+    if len({a["timezone"] for a in analyses}) > 1:
+        print("Warning: combining analyses made with different timezones")
+    merged = new_analysis(" + ".join(a["server"]["name"] for a in analyses), {}, filter_dict(analyses[0], settings))
+    merged.update(approximate=any(a.get("approximate") for a in analyses), estimated=any(a.get("estimated") for a in analyses), variants=all(a.get("variants") for a in analyses))
+    roles = {}
+    for a in analyses:
+        ids = add_analysis(merged, a)
+        for r, members in a["roles"].items():
+            roles.setdefault(r, {}).update(dict.fromkeys(ids[m] for m in members))
+    merged["roles"] = {r: list(members) for r, members in roles.items()}
+    return merged
+
+def add_analysis(merged, a, tag=True):
+    """Add the users, emoji, channel and server counters of an analysis to `merged`, tagging its channels with its server
+    name if `tag` is set. Users and emoji are started as in `merged`, so those of exact analyses get approximate counters
+    if it is approximate. Return the index in `merged` of each name of the analysis."""
+    ids = [intern(merged, name) for name in a["names"]]
+    received = received_counters(a) if merged.get("approximate") and not a.get("approximate") else {}
+    for id, info in a["users"].items():
+        if merged.get("approximate") and "mentioned_by" not in info:
+            info = {**info, **{f: {} for f in reverse_fields}, **received.get(id, {})}
+        merge_info(merged["users"][init_user(merged, a["names"][id])], translate(info, user_sketches, ids.__getitem__), merged["names"])
+    for id, info in a["emoji"].items():
+        merge_info(merged["emoji"][init_emoji(merged, a["names"][id])], translate(info, emoji_sketches, ids.__getitem__), merged["names"])
+    server = translate(filter_dict(a["server"], set(a["server"]) - {"name"}), channel_counters, ids.__getitem__)
+    merge_counters(merged["server"], align_variants(merged["server"], server))
+    for c, info in a["channels"].items():
+        channel = merged["channels"].setdefault(f"{c} [{a['server']['name']}]" if tag else c, {})
+        merge_counters(channel, align_variants(channel, translate(info, channel_counters, ids.__getitem__)))
+    return ids
+
+def translate(info, fields, key):
+    """Return a copy of the counters of a user, channel or emoji with the keys of `fields` translated by the function `key`."""
+    info = dict(info)
+    for f in [f for f in fields if f in info] + [alternatives[f] for f in fields if alternatives.get(f) in info]:
+        info[f] = {key(k): v for k, v in info[f].items()}
+    if "errors" in info:
+        info["errors"] = {f: {key(k): v for k, v in e.items()} for f, e in info["errors"].items()}
+        info["distinct"] = dict(info["distinct"])
+    if "totals" in info:
+        info["totals"] = dict(info["totals"])
+    return info
+
+def align_variants(d1, d2):
+    """Start in each of two counter sets about to be merged the alternative counters only the other one has. Return `d2`."""
+    for field, alt in alternatives.items():
+        for a, b in ((d1, d2), (d2, d1)):
+            if alt in a and b and alt not in b:
+                fork(b, field)
+    return d2
+
+def merge_sketches(d1, d2, field):
+    """Return the values, error bounds and sum of the approximate counter `field` of two users or emoji merged: a key
+    missing from a full counter may have had up to its smallest value, which is added to the value and error of the key,
+    and only the `sketch_size` largest values are kept. Counters of exact analyses are merged as they are."""
+    sides = [(d.get(field, {}), d["errors"].get(field, {}) if "errors" in d else None) for d in (d1, d2)]
+    floors = [min(c.values()) if e is not None and len(c) >= sketch_size else 0 for c, e in sides]
+    values, errors = {}, {}
+    for k in dict.fromkeys(k for c, e in sides for k in c):
+        values[k] = sum(c.get(k, floor) for (c, e), floor in zip(sides, floors))
+        error = sum((e or {}).get(k, 0) if k in c else floor for (c, e), floor in zip(sides, floors))
+        if error:
+            errors[k] = error
+    kept = set(heapq.nlargest(sketch_size, values, key=values.get))
+    values = {k: v for k, v in values.items() if k in kept}
+    return values, filter_dict(errors, kept), sum(total(d, field) for d in (d1, d2) if field in d)
+
+def merge_info(d1, d2, names):
+    """Add the counters of a user or emoji to another, merging approximate counters with `merge_sketches`. Distinct
+    count estimates are merged by keeping the largest registers."""
+    align_variants(d1, d2)
+    fields = list(d1.get("distinct", d2.get("distinct", {})))
+    exact = {f: [k for d in (d1, d2) if d and "distinct" not in d for k in d[f]] for f in fields}
+    sketches = {f: merge_sketches(d1, d2, f) for f in fields}
+    merge_counters(d1, filter_dict(d2, set(d2) - {"distinct", "errors", "totals"} - set(fields)))
+    for field, (values, errors, field_total) in sketches.items():
+        d1[field] = values
+        d1.setdefault("errors", {})[field] = errors
+        d1.setdefault("totals", {})[field] = field_total
+    for field, registers in d2.get("distinct", {}).items():
+        merged = d1.setdefault("distinct", {})
+        merged[field] = [max(r) for r in zip(merged.get(field, registers), registers)]
+    for field, keys in exact.items():
+        for k in keys:
+            hll_add(d1["distinct"][field], names[k])
+
+def received_counters(analysis):
+    """Return the `mentioned_by` and `replied_to_by` counters, and their alternatives, of the users of an exact analysis,
+    which only stores who each user mentions and replies to."""
+    received = {}
+    for u, info in analysis["users"].items():
+        for f, given in reverse_fields.items():
+            counters = [(f, info[given])]
+            if analysis.get("variants"):
+                counters.append((alternatives[f], info.get(alternatives[given], info[given])))
+            for field, counter in counters:
+                for v, n in counter.items():
+                    increment(received.setdefault(v, {}).setdefault(field, {}), u, n)
+    for counters in received.values():
+        for f in reverse_fields:
+            counters.setdefault(f, {})
+            if analysis.get("variants"):
+                counters.setdefault(alternatives[f], {})
+    return received
+
+def drop_received(analysis):
+    """Remove in place the `mentioned_by` and `replied_to_by` counters of the users of an exact analysis, which are read
+    from its interaction graph instead."""
+    if analysis.get("approximate"):
+        return
+    for info in analysis["users"].values():
+        for f in reverse_fields:
+            info.pop(f, None)
+            info.pop(alternatives[f], None)
+
+def convert_analysis(old):
+    """Return the analysis equivalent to one in the 1.0 format, where names are repeated as keys and histograms are dictionaries."""
+    analysis = new_analysis(old["server"]["name"], old["roles"], filter_dict(old, settings))
+    analysis.update(approximate=old.get("approximate", False), estimated=old.get("estimated", False), variants=False)
+    def convert(info, fields):
+        info = translate(info, fields, lambda name: intern(analysis, name))
+        if "active_hours" in info:
+            info["active_hours"] = [info["active_hours"][f"{h}h"] for h in range(24)]
+            info["active_days"] = [info["active_days"][d] for d in week_days]
+        return info
+    analysis["users"] = {intern(analysis, name): convert(info, user_sketches) for name, info in old["users"].items()}
+    analysis["emoji"] = {intern(analysis, e): convert(info, emoji_sketches) for e, info in old["emoji"].items()}
+    analysis["channels"] = {c: convert(info, channel_counters) for c, info in old["channels"].items()}
+    analysis["server"] = convert(old["server"], channel_counters)
+    drop_received(analysis)
+    return analysis
+
+def pack(obj):
+    """Return a copy of an analysis object ready to be serialized, with integer-keyed dictionaries stored as flat [key, value, ...] lists."""
+    if isinstance(obj, dict):
+        if obj and isinstance(next(iter(obj)), int):
+            return [x for k, v in obj.items() for x in (k, pack(v))]
+        return {k: pack(v) for k, v in obj.items()}
+    return obj
+
+def unpack(obj):
+    """Restore in place the integer-keyed dictionaries of a deserialized analysis object."""
+    for k, v in obj.items():
+        if k in ("names", "roles", "distinct"):
+            continue
+        if isinstance(v, list) and k in sparse_fields:
+            v = obj[k] = dict(zip(v[::2], v[1::2]))
+        if isinstance(v, dict):
+            unpack(v)
+
+def read_analysis(obj):
+    """Return the analysis stored in a deserialized analysis file, converting it from the 1.0 format if needed, or `None`
+    if it is not an analysis of a known version. Scan files also have version 1.0, so they are told apart by their users."""
+    if "users" not in obj:
+        print("Incompatible version")
+        return None
+    if obj.get("version") == "1.0":
+        return convert_analysis(obj)
+    if obj.get("version") != analysis_version:
+        print("Incompatible version")
+        return None
+    unpack(obj)
+    obj["ids"] = {name: id for id, name in enumerate(obj["names"])}
+    drop_received(obj)
+    return obj
+
+def export_analysis(analysis, filename):
+    """Serialize an analysis in the compact format and write it to a file."""
+    export(pack(filter_dict(analysis, set(analysis) - {"ids"})), filename)
+
+def load_analysis(path, settings):
+    """Return the analysis stored in a scan or analysis file, or a sharded scan directory, analyzing it first with `settings` if it is a scan."""
+    if isdir(path):
+        return import_sharded_scan(path, settings, messages=False)[1]
+    obj = import_file(path)
+    if not obj:
+        return None
+    if "users" in obj:
+        return read_analysis(obj)
+    if obj.get("version") == scan_version:
+        return analyze_scan(obj, settings)
+    print(f"Incompatible version: '{path}'")
+
+def combine_files(paths, settings):
+    """Load and analyze the scan and analysis files in parallel and return their combined analysis."""
+    with ProcessPoolExecutor() as executor:
+        analyses = [a for a in executor.map(load_analysis, paths, repeat(settings)) if a]
+    return merge_analyses(analyses) if analyses else None
+
+def export_sharded_scan(scan, directory):
+    """Write a scan to `directory` as a manifest with the server, roles and state of each channel, and one shard file
+    with the messages of each channel. Shards whose messages have not changed since the last export are not written
+    again, according to the digests kept in the manifest. Return the number of shards written."""
+    manifest_path = join(directory, "manifest.json")
+    previous = import_file(manifest_path) if isfile(manifest_path) else {}
+    previous = previous.get("channels", {}) if previous else {}
+    channels, written = {}, 0
+    try:
+        makedirs(join(directory, "channels"), exist_ok=True)
+        for id, info in scan["channels"].items():
+            messages = json.dumps(info["messages"])
+            digest = hashlib.blake2b(messages.encode()).hexdigest()
+            path = join(directory, "channels", f"{id}.json")
+            if previous.get(id, {}).get("digest") != digest or not isfile(path):
+                with open(path + ".tmp", "w") as file:
+                    file.write(messages)
+                replace(path + ".tmp", path)
+                written += 1
+            channels[id] = {**filter_dict(info, set(info) - {"messages"}), "digest": digest}
+        for id in set(previous) - set(channels):
+            if isfile(join(directory, "channels", f"{id}.json")):
+                remove(join(directory, "channels", f"{id}.json"))
+    except OSError as e:
+        print(e)
+        return written
+    export({"version": scan_version, "server": scan["server"], "roles": scan["roles"], "channels": channels}, manifest_path)
+    return written
+
+def analyze_shard(path, info, settings, messages=False):
+    """Return the messages of a scan shard if `messages` is set, or `None`, and the analysis of its channel alone, or
+    `False` and `None` if the shard could not be read."""
+    shard = import_file(path)
+    if shard is False:
+        return False, None
+    analysis = new_analysis("", {}, settings)
+    analyze_channel(analysis, {**info, "messages": shard})
+    return shard if messages else None, analysis
+
+def import_sharded_scan(directory, settings, messages=True):
+    """Return the scan stored in a sharded scan directory, or `None` without `messages`, and its analysis made with `settings`.
+    Each shard is read and its channel analyzed by a worker, which only sends back its messages if the scan is wanted,
+    and the analyses of the channels are added up as soon as they are ready. Approximate counters are merged with
+    `merge_sketches`, so they may differ from those of `analyze_scan` within their error bounds."""
+    manifest = import_file(join(directory, "manifest.json"), scan_version)
+    if not manifest:
+        return None, None
+    scan = {"version": scan_version, "server": manifest["server"], "channels": {}, "roles": manifest["roles"]}
+    analysis = new_analysis(scan["server"]["name"], scan["roles"], settings)
+    channels = {}
+    with ProcessPoolExecutor() as executor:
+        futures = {executor.submit(analyze_shard, join(directory, "channels", f"{id}.json"), info, settings, messages): id for id, info in manifest["channels"].items()}
+        for future in as_completed(futures):
+            id = futures[future]
+            info = manifest["channels"][id]
+            shard, partial = future.result()
+            if not partial:
+                print(f"Skipping '{info['name']}': its shard could not be read")
+                continue
+            channels[id] = {**filter_dict(info, set(info) - {"digest"}), "messages": shard}
+            add_analysis(analysis, partial, tag=False)
+            if partial.get("estimated"):
+                analysis["estimated"] = True
+    scan["channels"] = {id: channels[id] for id in manifest["channels"] if id in channels}
+    analysis["channels"] = {c["name"]: analysis["channels"][c["name"]] for c in scan["channels"].values() if c["name"] in analysis["channels"]}
+    if analysis.get("estimated"):
+        round_counters(analysis)
+    return scan if messages else None, analysis
 
 def import_file(path, check_version=None):
     """Return JSON deserialized object read from file. Return false if `OSError` occured."""
     try:
         with open(path, "r") as file:
             obj = json.load(file)
-        if check_version and "version" not in obj or obj["version"] != check_version:
+        if check_version and ("version" not in obj or obj["version"] != check_version):
             print("Incompatible version")
         else:
             return obj
@@ -369,15 +1226,16 @@ def import_file(path, check_version=None):
 def export(obj, filename):
     """Serialize object as JSON and write it to a file."""
     try:
-        with open(filename, "w") as file:
+        with open(filename + ".tmp", "w") as file:
             json.dump(obj, file)
+        replace(filename + ".tmp", filename)
     except OSError as e:
         print(e)
     print(f"Exported to '{filename}'")
 
 def reanalyze_prompt():
     """Prompt the user to analyze again if `always_reanalyze` is set to `False`"""
-    global always_reanalyze
+    global analysis, always_reanalyze
     if not always_reanalyze:
         print("Note: this setting only takes effect during the analysis process")
     if scan:
@@ -390,163 +1248,66 @@ def reanalyze_prompt():
                 if ans[0] == "n": return
                 if ans[0] == "a": always_reanalyze = True; break
         print("Analyzing scan...")
-        analyze_scan()
-
-def bar_chart(data, sort=False, width=50):
+        analysis = Analysis(analyze_scan(scan, settings), **display)
+
+def switch_variant(setting):
+    """Make the analysis read the counters of a setting in `variant_fields` as it is now set. Analyses from older versions
+    keep a single variant of them, so they have to be made again from the scan instead."""
+    if not analysis:
+        return
+    if analysis.data.get("variants"):
+        setattr(analysis, setting, display[setting])
+    else:
+        print("This analysis only has counts for the previous setting")
+        reanalyze_prompt()
+
+def bar_chart(data, sort=False, width=50, top=None, others=True):
     """Display a horizontal bar chart."""
-    label_length = len(max(data.keys(), key=lambda l: len(l)))
-    items = sorted(data.items(), key=lambda x: x[1], reverse=True) if sort else data.items()
+    print(format_bar_chart(data, sort, width, top, others))
+
+def format_bar_chart(data, sort=False, width=50, top=None, others=True):
+    """Return a horizontal bar chart as text. With `top`, only the largest values are drawn, followed by the sum of the
+    remaining ones in an "Others" bar if `others` is set. The scale is set by the largest value drawn, and the "Others"
+    bar is cut at `width`."""
+    if top is not None and len(data) > top:
+        items = heapq.nlargest(top, data.items(), key=lambda x: x[1])
+    else:
+        items = sorted(data.items(), key=lambda x: x[1], reverse=True) if sort else list(data.items())
+    if not items:
+        return ""
+    peak = max(1, max(v for l, v in items))
+    if len(items) < len(data) and others:
+        items.append((f"Others ({len(data) - len(items)})", sum(data.values()) - sum(v for l, v in items)))
+    label_length = max(len(l) for l, v in items)
+    lines = []
     for l, v in items:
-        size = round(v/max(1, max(data.values())) * width)
-        print(f"{l.rjust(label_length, ' ')}: {'▇' * size}{' ' if size else ''}{v}")
-
-def get_users_table(metrics, role_filter):
-    """Return a table with a line for each user and a column for each metric."""
-    table = []
-    users = set(flatten(filter_dict(analysis["roles"], role_filter).values()))
-    for u in users:
-        info = analysis["users"][u] if u in analysis["users"] else {}
-        line = {
-            "User": u,
-            "Messages": info["messages"] if info else 0,
-            "Characters\ntyped": info["chars_typed"] if info else 0,
-            "Characters\nper message": round(info["chars_typed"]/info["messages"], 1) if info and info["messages"] > 0 else "-",
-            "Emoji\nused": sum(info["emoji"].values()) if info else 0,
-            "Top\nemoji": max_value(info["emoji"]) if info and info["emoji"] else "-",
-            "Reactions": sum(info["reactions"].values()) if info else 0,
-            "Top\nreaction": max_value(info["reactions"]) if info and info["reactions"] else "-",
-            "Top overall\nemoji": max_value(add_dicts(info["emoji"], info["reactions"])) if info and (info["emoji"] or info["reactions"]) else "-",
-            "Reactions\nreceived": sum(info["reactions_received"].values()) if info else 0,
-            "Top reaction\nreceived": max_value(info["reactions_received"]) if info and info["reactions_received"] else "-",
-            "Mentions": sum(info["mentions"].values()) if info else 0,
-            "Times\nmentioned": sum(info["mentioned_by"].values()) if info else 0,
-            "Replies": sum(info["replies"].values()) if info else 0,
-            "Times\nreplied to": sum(info["replied_to_by"].values()) if info else 0,
-            "Links": info["links"] if info else 0,
-            "Attachments": sum(info["attachments"].values()) if info else 0,
-            "Top attachment\ntype": max_value(info["attachments"]) if info and info["attachments"] else "-",
-        }
-        table.append(filter_dict(line, ["User"]+metrics))
-    return table
-
-def get_channels_table(metrics):
-    """Return a table with a line for each channel and a column for each metric."""
-    table = []
-    for c in analysis["channels"]:
-        info = analysis["channels"][c]
-        line = {
-            "Channel": c,
-            "Messages": sum(info["messages"].values()),
-            "Top message\nsender": max_value(info["messages"]) if info["messages"] else "-",
-            "Characters\ntyped": sum(info["chars_typed"].values()),
-            "Characters\nper message": round(sum(info["chars_typed"].values())/sum(info["messages"].values()), 1) if sum(info["messages"].values()) > 0 else "-",
-            "Top character\ntyper": max_value(info["chars_typed"]) if info["chars_typed"] else "-",
-            "Emoji\nused": sum(info["emoji"].values()),
-            "Top\nemoji": max_value(info["emoji"]) if info["emoji"] else "-",
-            "Reactions": sum(info["reactions"].values()),
-            "Top\nreaction": max_value(info["reactions"]) if info["reactions"] else "-",
-            "Top overall\nemoji": max_value(add_dicts(info["emoji"], info["reactions"])) if (info["emoji"] or info["reactions"]) else "-",
-            "Mentions": sum(info["mentions"].values()),
-            "Top\nmentioner": max_value(info["mentions"]) if info["mentions"] else "-",
-            "Top\nmentioned": max_value(info["mentioned"]) if info["mentioned"] else "-",
-            "Replies": sum(info["replies"].values()),
-            "Top\nreplier": max_value(info["replies"]) if info["replies"] else "-",
-            "Top\nreplied to": max_value(info["replied_to"]) if info["replied_to"] else "-",
-            "Links": sum(info["links"].values()),
-            "Top link\nsender": max_value(info["links"]) if info["links"] else "-",
-            "Attachments": sum([sum(info["attachments"][user].values()) for user in info["attachments"]]),
-            "Top attachment\ntype": max_value(compress_dict(info["attachments"])) if info["attachments"] else "-",
-            "Top attachment\nsender": max(info["attachments"], key=lambda u: sum(info["attachments"][u].values())) if info["attachments"] else "-",
-        }
-        table.append(filter_dict(line, ["Channel"]+metrics))
-    return table
-
-def show_user_metrics(name):
-    """Display specific user metrics."""
-    info = analysis["users"][name]
-    print("Messages:", info["messages"] if info else 0)
-    print("Characters typed:", info["chars_typed"] if info else 0)
-    if info and info["messages"]:
-        print("Characters per message:", "{:.1f}".format(info["chars_typed"]/info["messages"]))
-    print("Emoji used:", sum(info["emoji"].values()) if info else 0)
-    print("Reactions:", sum(info["reactions"].values()) if info else 0)
-    print("Reactions received:", sum(info["reactions_received"].values()) if info else 0)
-    print("Mentions:", sum(info["mentions"].values()) if info else 0)
-    print("Times mentioned:", sum(info["mentioned_by"].values()) if info else 0)
-    print("Replies:", sum(info["replies"].values()) if info else 0)
-    print("Times replied to:", sum(info["replied_to_by"].values()) if info else 0)
-    print("Links:", info["links"] if info else 0)
-    print("Attachments:", sum(info["attachments"].values()) if info else 0)
-
-def show_metrics(info):
-    """Display specific server or channel metrics."""
-    print("Messages:", sum(info["messages"].values()))
-    print("Characters typed:", sum(info["chars_typed"].values()))
-    if info and info["messages"]:
-        print("Characters per message:", "{:.1f}".format(sum(info["chars_typed"].values())/sum(info["messages"].values())))
-    print("Emoji used:", sum(info["emoji"].values()))
-    print("Reactions:", sum(info["reactions"].values()))
-    print("Mentions:", sum(info["mentions"].values()))
-    print("Replies:", sum(info["replies"].values()))
-    print("Links:", sum(info["links"].values()))
-    print("Attachments:", sum([sum(info["attachments"][user].values()) for user in info["attachments"]]))
-
-def show_emoji_metrics(info):
-    """Display specific emoji metrics."""
-    print("Times used in messages:", sum(info["in_message"].values()))
-    if info["in_message"]:
-        print("Top user in messages:", max_value(info["in_message"]))
-    print("Times used as reaction:", sum(info["reactions_given"].values()))
-    if info["reactions_given"]:
-        print("Top user as reaction:", max_value(info["reactions_given"]))
-    if info["reactions_received"]:
-        print("Top receiver as reaction:", max_value(info["reactions_received"]))
-    print("Times used overall:", sum(info["in_message"].values()) + sum(info["reactions_given"].values()))
-    if info["in_message"] or info["reactions_given"]:
-        print("Top user overall:", max_value(add_dicts(info["in_message"], info["reactions_given"])))
-
-def get_user_ranks(name):
-    """Return a table with a line for each rank and a column for each user rank metric."""
-    info = analysis["users"][name]
-    table = []
-    rows = min(10, max((len(info["emoji"]), len(add_dicts(info["emoji"], info["reactions"])), len(info["reactions_received"]))))
-    for i in range(rows):
-        table.append({
-            "Rank": f"#{i+1}",
-            "Emoji\nused": sort_dict_keys(info["emoji"])[i] if len(info["emoji"]) > i else "-",
-            "Reaction": sort_dict_keys(info["reactions"])[i] if len(info["reactions"]) > i else "-",
-            "Overall\nemoji": sort_dict_keys(add_dicts(info["emoji"], info["reactions"]))[i] if len(add_dicts(info["emoji"], info["reactions"])) > i else "-",
-            "Reactions\nreceived": sort_dict_keys(info["reactions_received"])[i] if len(info["reactions_received"]) > i else "-",
-            "Mentioned": sort_dict_keys(info["mentions"])[i] if len(info["mentions"]) > i else "-",
-            "Mentioned\nby": sort_dict_keys(info["mentioned_by"])[i] if len(info["mentioned_by"]) > i else "-",
-            "Replied": sort_dict_keys(info["replies"])[i] if len(info["replies"]) > i else "-",
-            "Replied\nto by": sort_dict_keys(info["replied_to_by"])[i] if len(info["replied_to_by"]) > i else "-",
-            "Attachment\ntype": sort_dict_keys(info["attachments"])[i] if len(info["attachments"]) > i else "-",
-        })
-    return table
-
-def get_ranks(info, ranks):
-    """Return a table with a line for each rank and a column for each server or channel rank metric."""
-    table = []
-    rows = min(10, max((len(info["emoji"]), len(add_dicts(info["emoji"], info["reactions"])), len(info["reactions_received"]))))
-    for i in range(rows):
-        line = {
-            "Rank": f"#{i+1}",
-            "Message\nsender": sort_dict_keys(info["messages"])[i] if len(info["messages"]) > i else "-",
-            "Character\ntyper": sort_dict_keys(info["chars_typed"])[i] if len(info["chars_typed"]) > i else "-",
-            "Emoji\nused": sort_dict_keys(info["emoji"])[i] if len(info["emoji"]) > i else "-",
-            "Reaction": sort_dict_keys(info["reactions"])[i] if len(info["reactions"]) > i else "-",
-            "Overall\nemoji": sort_dict_keys(add_dicts(info["emoji"], info["reactions"]))[i] if len(add_dicts(info["emoji"], info["reactions"])) > i else "-",
-            "Mentioner": sort_dict_keys(info["mentions"])[i] if len(info["mentions"]) > i else "-",
-            "Mentioned": sort_dict_keys(info["mentioned"])[i] if len(info["mentioned"]) > i else "-",
-            "Replier": sort_dict_keys(info["replies"])[i] if len(info["replies"]) > i else "-",
-            "Replied\nto": sort_dict_keys(info["replied_to"])[i] if len(info["replied_to"]) > i else "-",
-            "Link\nsender": sort_dict_keys(info["links"])[i] if len(info["links"]) > i else "-",
-            "Attachment\ntype": sort_dict_keys(compress_dict(info["attachments"]))[i] if len(compress_dict(info["attachments"])) > i else "-",
-            "Attachment\nsender": sorted(info["attachments"], key=lambda u: sum(info["attachments"][u].values()), reverse=True)[i] if len(info["attachments"]) > i else "-",
-        }
-        table.append(filter_dict(line, ["Rank"]+ranks))
-    return table
+        size = min(width, round(v/peak * width))
+        lines.append(f"{l.rjust(label_length, ' ')}: {'▇' * size}{' ' if size else ''}{v}")
+    return "\n".join(lines)
+
+def histogram(values, base=10):
+    """Return how many of `values` fall in each range between consecutive powers of `base`, such as 1–10 and 10–100,
+    from the lowest to the highest range used. Values between 0 and 1 are counted in a "0–1" range, and zeros in a "0" one."""
+    bins = Counter()
+    for v in values:
+        lower = 1 if v >= 1 else 0 if v > 0 else None
+        while lower and lower * base <= v:
+            lower *= base
+        bins[lower] += 1
+    if not bins:
+        return {}
+    ranges = [r for r in (None, 0) if r in bins]
+    lower = 1
+    while lower <= max((r for r in bins if r is not None), default=0):
+        ranges.append(lower)
+        lower *= base
+    low = min((r for r in bins if r is not None), default=None)
+    return {("0" if r is None else "0–1" if r == 0 else f"{r}–{r * base}"): bins[r] for r in ranges if not r or r >= low}
+
+def show_metrics(metrics):
+    """Display metric names and values, one per line."""
+    for name, value in metrics:
+        print(f"{name}:", value)
 
 def show_table(table):
     """Display a given table. Prompt the user if the table is to wide for the terminal window and `always_show` is set to `False`"""
@@ -562,40 +1323,551 @@ def show_table(table):
             if ans[0] == "a": always_show = True; break
     print(table_str)
 
-def show_hours(info, time_format):
+def show_hours(analysis, info):
     """Display a chart with the amount of messages per hour of the day."""
-    print(f"Timezone: {analysis['timezone']}\n")
-    active_hours = info["active_hours"]
-    if time_format == "12h":
-        convert_format = lambda h: datetime.strptime(h.replace("h", ""), "%H").strftime("%-I %p")
-        active_hours = {convert_format(h): v for h, v in active_hours.items()}
-    bar_chart(active_hours)
-
-def show_days(info):
+    print(f"Timezone: {analysis.data['timezone']}\n")
+    bar_chart(analysis.hours(info))
+
+def show_days(analysis, info):
     """Display a chart with the amount of messages per day of the week."""
-    print(f"Timezone: {analysis['timezone']}\n")
-    bar_chart(info["active_days"])
-
-def get_emoji_table(rows):
-    """Return a table with a line for each ranked emoji and a column for each emoji metric."""
-    table = []
-    emoji = analysis["emoji"]
-    emoji = sorted(emoji, key=lambda e: sum(emoji[e]["in_message"].values()) + sum(emoji[e]["reactions_given"].values()), reverse=True)
-    for i, e in enumerate(emoji[:rows]):
-        info = analysis["emoji"][e]
-        table.append({
-            "Rank": f"#{i+1}",
-            "Emoji": e,
-            "Times used\nin messages": sum(info["in_message"].values()),
-            "Top user\nin messages": max_value(info["in_message"]) if info["in_message"] else "-",
-            "Times used\nas reaction": sum(info["reactions_given"].values()),
-            "Top user\nas reaction": max_value(info["reactions_given"]) if info["reactions_given"] else "-",
-            "Top receiver\nas reaction": max_value(info["reactions_received"]) if info["reactions_received"] else "-",
-            "Times used\noverall": sum(info["in_message"].values()) + sum(info["reactions_given"].values()),
-            "Top user\noverall": max_value(add_dicts(info["in_message"], info["reactions_given"])) if info["in_message"] or info["reactions_given"] else "-",
-        })
-    return table
+    print(f"Timezone: {analysis.data['timezone']}\n")
+    bar_chart(analysis.days(info))
+
+
+############
+# Analysis #
+############
+
+class Analysis:
+    """Query methods over an analysis. Holds its own display settings and caches, and can be shared between threads:
+    queries and changes made through `update` hold the same lock."""
+
+    def __init__(self, data, time_format="24h", repeat_emoji=True, legacy_replies=True):
+        self.data = data
+        self.time_format = time_format
+        self.repeat_emoji = repeat_emoji
+        self.legacy_replies = legacy_replies
+        self.lock = RLock()
+        self.cache = {}
+
+    def update(self, function, *args, **kwargs):
+        """Apply a function that changes the analysis data, such as `apply_event`, and clear the caches."""
+        with self.lock:
+            self.cache.clear()
+            return function(self.data, *args, **kwargs)
+
+    def cached(self, name, compute, *counters):
+        """Return `compute(*counters)`, computed once for the same counters and display settings until the analysis changes."""
+        key = (name, self.repeat_emoji, self.legacy_replies) + tuple(id(d) for d in counters)
+        with self.lock:
+            if key not in self.cache:
+                self.cache[key] = (counters, compute(*counters))    # keep a reference to the counters so their ids are not reused
+            return self.cache[key][1]
+
+    def view(self, info):
+        """Return the counters of a user, channel, emoji or the server as read with the display settings: the alternative
+        of each counter in `variant_fields` replaces it when its setting is disabled."""
+        if not self.data.get("variants"):
+            return info
+        disabled = [s for s in variant_fields if not getattr(self, s)]
+        fields = [f for s in disabled for f in variant_fields[s] if alternatives[f] in info]
+        if not fields:
+            return info
+        view = dict(info)
+        for f in fields:
+            view[f] = info[alternatives[f]]
+        if "errors" in info:
+            view["errors"] = {**info["errors"], **{f: info["errors"][alternatives[f]] for f in fields}}
+            view["distinct"] = {**info["distinct"], **{f: info["distinct"][alternatives[f]] for f in fields}}
+            if "totals" in info:
+                view["totals"] = {**info["totals"], **{f: total(info, alternatives[f]) for f in fields}}
+        return view
+
+    def ranking(self, d):
+        """Return the keys of the counters `d` ordered by value."""
+        return self.cached("ranking", sort_dict_keys, d)
+
+    def overall_ranking(self, info):
+        """Return the emoji of a user, channel or server ordered by their use in messages and as reactions."""
+        return self.cached("overall", lambda e, r: sort_dict_keys(add_dicts(e, r)), info["emoji"], info["reactions"])
+
+    def attachment_types(self, info):
+        """Return the attachment types of a channel or server ordered by count."""
+        return self.cached("attachment types", lambda a: sort_dict_keys(compress_dict(a)), info["attachments"])
+
+    def attachment_senders(self, info):
+        """Return the users of a channel or server ordered by number of attachments sent."""
+        return self.cached("attachment senders", lambda a: sorted(a, key=lambda u: sum(a[u].values()), reverse=True), info["attachments"])
+
+    def graph(self, field, reverse=False):
+        """Return the graph of the `mentions` or `replies` counters of the users as read with the display settings, or
+        the graph of who they were mentioned or replied to by with `reverse`."""
+        with self.lock:
+            graph = self.cached(("graph", field), lambda users: build_graph({u: self.view(info)[field] for u, info in users.items()}, len(self.data["names"])), self.data["users"])
+            return self.cached("reverse graph", transpose_graph, graph) if reverse else graph
+
+    def received(self, id):
+        """Return the `mentioned_by` and `replied_to_by` counters of a user that the analysis does not store, read from the interaction graph."""
+        info = self.data["users"][id]
+        return {f: neighbors(self.graph(given, reverse=True), id) for f, given in reverse_fields.items() if f not in info}
+
+    def user(self, id):
+        """Return the counters of a user as read with the display settings, including the ones read from the interaction graph."""
+        info = self.data["users"][id]
+        if "mentioned_by" in info:
+            return self.view(info)
+        return self.cached(("user", id), lambda info: {**self.view(info), **self.received(id)}, info)
+
+    def times_received(self, id, field):
+        """Return how many times a user was mentioned or replied to, for `field` "mentioned_by" or "replied_to_by"."""
+        info = self.view(self.data["users"][id])
+        if field in info:
+            return total(info, field)
+        graph = self.graph(reverse_fields[field], reverse=True)
+        return sum(graph["weights"][graph["indptr"][id]:graph["indptr"][id + 1]]) if id < len(graph["indptr"]) - 1 else 0
+
+    def reciprocity(self, field):
+        """Return the fraction of the users mentioned or replied to by someone who mention or reply to them back."""
+        def compute(graph):
+            edges = [(u, v) for u, v, n in edge_list(graph) if u != v]
+            return sum(1 for u, v in edges if edge_weight(graph, v, u)) / len(edges) if edges else 0
+        return self.cached(("reciprocity", field), compute, self.graph(field))
+
+    def name(self, id):
+        """Return the user name or emoji with the index given."""
+        return self.data["names"][id]
+
+    def label(self, info, fields, key):
+        """Return the name of `key` followed by its error bound if it is approximate."""
+        return label(info, fields, key, self.data["names"])
+
+    def users_table(self, metrics, role_filter):
+        """Return a table with a line for each user and a column for each metric."""
+        with self.lock:
+            table = []
+            label = self.label
+            users = set(flatten(filter_dict(self.data["roles"], role_filter).values()))
+            for u in users:
+                info = self.view(self.data["users"][u]) if u in self.data["users"] else {}
+                line = {
+                    "User": self.name(u),
+                    "Messages": info["messages"] if info else 0,
+                    "Characters\ntyped": info["chars_typed"] if info else 0,
+                    "Characters\nper message": round(info["chars_typed"]/info["messages"], 1) if info and info["messages"] > 0 else "-",
+                    "Emoji\nused": total(info, "emoji") if info else 0,
+                    "Top\nemoji": label(info, ["emoji"], max_value(info["emoji"])) if info and info["emoji"] else "-",
+                    "Reactions": total(info, "reactions") if info else 0,
+                    "Top\nreaction": label(info, ["reactions"], max_value(info["reactions"])) if info and info["reactions"] else "-",
+                    "Top overall\nemoji": label(info, ["emoji", "reactions"], self.overall_ranking(info)[0]) if info and (info["emoji"] or info["reactions"]) else "-",
+                    "Reactions\nreceived": total(info, "reactions_received") if info else 0,
+                    "Top reaction\nreceived": label(info, ["reactions_received"], max_value(info["reactions_received"])) if info and info["reactions_received"] else "-",
+                    "Mentions": total(info, "mentions") if info else 0,
+                    "Times\nmentioned": self.times_received(u, "mentioned_by") if info else 0,
+                    "Replies": total(info, "replies") if info else 0,
+                    "Times\nreplied to": self.times_received(u, "replied_to_by") if info else 0,
+                    "Links": info["links"] if info else 0,
+                    "Attachments": sum(info["attachments"].values()) if info else 0,
+                    "Top attachment\ntype": max_value(info["attachments"]) if info and info["attachments"] else "-",
+                }
+                table.append(filter_dict(line, ["User"]+metrics))
+            return table
+
+    def channels_table(self, metrics):
+        """Return a table with a line for each channel and a column for each metric."""
+        with self.lock:
+            table = []
+            name = self.name
+            for c, info in self.data["channels"].items():
+                info = self.view(info)
+                messages = sum(info["messages"].values())
+                line = {
+                    "Channel": c,
+                    "Messages": messages,
+                    "Top message\nsender": name(max_value(info["messages"])) if info["messages"] else "-",
+                    "Characters\ntyped": sum(info["chars_typed"].values()),
+                    "Characters\nper message": round(sum(info["chars_typed"].values())/messages, 1) if messages > 0 else "-",
+                    "Top character\ntyper": name(max_value(info["chars_typed"])) if info["chars_typed"] else "-",
+                    "Emoji\nused": total(info, "emoji"),
+                    "Top\nemoji": name(max_value(info["emoji"])) if info["emoji"] else "-",
+                    "Reactions": total(info, "reactions"),
+                    "Top\nreaction": name(max_value(info["reactions"])) if info["reactions"] else "-",
+                    "Top overall\nemoji": name(self.overall_ranking(info)[0]) if (info["emoji"] or info["reactions"]) else "-",
+                    "Mentions": total(info, "mentions"),
+                    "Top\nmentioner": name(max_value(info["mentions"])) if info["mentions"] else "-",
+                    "Top\nmentioned": name(max_value(info["mentioned"])) if info["mentioned"] else "-",
+                    "Replies": total(info, "replies"),
+                    "Top\nreplier": name(max_value(info["replies"])) if info["replies"] else "-",
+                    "Top\nreplied to": name(max_value(info["replied_to"])) if info["replied_to"] else "-",
+                    "Links": sum(info["links"].values()),
+                    "Top link\nsender": name(max_value(info["links"])) if info["links"] else "-",
+                    "Attachments": sum([sum(info["attachments"][user].values()) for user in info["attachments"]]),
+                    "Top attachment\ntype": self.attachment_types(info)[0] if info["attachments"] else "-",
+                    "Top attachment\nsender": name(self.attachment_senders(info)[0]) if info["attachments"] else "-",
+                }
+                table.append(filter_dict(line, ["Channel"]+metrics))
+            return table
+
+    def user_metrics(self, id):
+        """Return the name and value of each metric of a user."""
+        with self.lock:
+            info = self.user(id)
+            metrics = [
+                ("Messages", info["messages"] if info else 0),
+                ("Characters typed", info["chars_typed"] if info else 0),
+            ]
+            if info and info["messages"]:
+                metrics.append(("Characters per message", "{:.1f}".format(info["chars_typed"]/info["messages"])))
+            return metrics + [
+                ("Emoji used", total(info, "emoji") if info else 0),
+                ("Distinct emoji used", distinct(info, "emoji")),
+                ("Reactions", total(info, "reactions") if info else 0),
+                ("Distinct reactions", distinct(info, "reactions")),
+                ("Reactions received", total(info, "reactions_received") if info else 0),
+                ("Mentions", total(info, "mentions") if info else 0),
+                ("Distinct users mentioned", distinct(info, "mentions")),
+                ("Times mentioned", total(info, "mentioned_by") if info else 0),
+                ("Replies", total(info, "replies") if info else 0),
+                ("Distinct users replied to", distinct(info, "replies")),
+                ("Times replied to", total(info, "replied_to_by") if info else 0),
+                ("Links", info["links"] if info else 0),
+                ("Attachments", sum(info["attachments"].values()) if info else 0),
+            ]
+
+    def metrics(self, info):
+        """Return the name and value of each metric of a server or channel."""
+        with self.lock:
+            info = self.view(info)
+            metrics = [
+                ("Messages", sum(info["messages"].values())),
+                ("Characters typed", sum(info["chars_typed"].values())),
+            ]
+            if info and info["messages"]:
+                metrics.append(("Characters per message", "{:.1f}".format(sum(info["chars_typed"].values())/sum(info["messages"].values()))))
+            return metrics + [
+                ("Emoji used", total(info, "emoji")),
+                ("Reactions", total(info, "reactions")),
+                ("Mentions", total(info, "mentions")),
+                ("Replies", total(info, "replies")),
+                ("Links", sum(info["links"].values())),
+                ("Attachments", sum([sum(info["attachments"][user].values()) for user in info["attachments"]])),
+            ]
+
+    def emoji_metrics(self, info):
+        """Return the name and value of each metric of an emoji."""
+        with self.lock:
+            info = self.view(info)
+            label = self.label
+            metrics = [("Times used in messages", total(info, "in_message"))]
+            if info["in_message"]:
+                metrics.append(("Top user in messages", label(info, ["in_message"], max_value(info["in_message"]))))
+            metrics.append(("Times used as reaction", total(info, "reactions_given")))
+            if info["reactions_given"]:
+                metrics.append(("Top user as reaction", label(info, ["reactions_given"], max_value(info["reactions_given"]))))
+            if info["reactions_received"]:
+                metrics.append(("Top receiver as reaction", label(info, ["reactions_received"], max_value(info["reactions_received"]))))
+            metrics.append(("Times used overall", total(info, "in_message") + total(info, "reactions_given")))
+            if info["in_message"] or info["reactions_given"]:
+                metrics.append(("Top user overall", label(info, ["in_message", "reactions_given"], max_value(add_dicts(info["in_message"], info["reactions_given"])))))
+            return metrics
+
+    def user_ranks(self, id):
+        """Return a table with a line for each rank and a column for each user rank metric."""
+        with self.lock:
+            info = self.user(id)
+            label, ranking = self.label, self.ranking
+            overall = self.overall_ranking(info)
+            cell = lambda fields, keys, i: label(info, fields, keys[i]) if len(keys) > i else "-"
+            table = []
+            rows = min(10, max((len(info["emoji"]), len(overall), len(info["reactions_received"]))))
+            for i in range(rows):
+                table.append({
+                    "Rank": f"#{i+1}",
+                    "Emoji\nused": cell(["emoji"], ranking(info["emoji"]), i),
+                    "Reaction": cell(["reactions"], ranking(info["reactions"]), i),
+                    "Overall\nemoji": cell(["emoji", "reactions"], overall, i),
+                    "Reactions\nreceived": cell(["reactions_received"], ranking(info["reactions_received"]), i),
+                    "Mentioned": cell(["mentions"], ranking(info["mentions"]), i),
+                    "Mentioned\nby": cell(["mentioned_by"], ranking(info["mentioned_by"]), i),
+                    "Replied": cell(["replies"], ranking(info["replies"]), i),
+                    "Replied\nto by": cell(["replied_to_by"], ranking(info["replied_to_by"]), i),
+                    "Attachment\ntype": ranking(info["attachments"])[i] if len(info["attachments"]) > i else "-",
+                })
+            return table
+
+    def pairs_table(self, rows):
+        """Return a table with a line for each of the pairs of users who mention and reply to each other the most."""
+        with self.lock:
+            mentions, replies = self.graph("mentions"), self.graph("replies")
+            def compute(mentions, replies):
+                totals = Counter()
+                for graph in (mentions, replies):
+                    for u, v, n in edge_list(graph):
+                        if u != v:
+                            totals[min(u, v), max(u, v)] += n
+                return heapq.nlargest(rows, totals.items(), key=lambda x: x[1])
+            table = []
+            for i, ((a, b), total) in enumerate(self.cached(("pairs", rows), compute, mentions, replies)):
+                table.append({
+                    "Rank": f"#{i+1}",
+                    "User A": self.name(a),
+                    "User B": self.name(b),
+                    "A mentions\nB": edge_weight(mentions, a, b),
+                    "B mentions\nA": edge_weight(mentions, b, a),
+                    "A replies\nto B": edge_weight(replies, a, b),
+                    "B replies\nto A": edge_weight(replies, b, a),
+                    "Interactions": total,
+                })
+            return table
+
+    def degrees_table(self, role_filter):
+        """Return a table with a line for each user and how many users they interact with in each direction."""
+        with self.lock:
+            table = []
+            graphs = {field: (self.graph(field), self.graph(field, reverse=True)) for field in ("mentions", "replies")}
+            mutual = lambda graph, u: sum(1 for v in neighbors(graph, u) if v != u and edge_weight(graph, v, u))
+            for u in set(flatten(filter_dict(self.data["roles"], role_filter).values())):
+                (mentions, mentioned_by), (replies, replied_to_by) = graphs["mentions"], graphs["replies"]
+                table.append({
+                    "User": self.name(u),
+                    "Users\nmentioned": degree(mentions, u),
+                    "Mentioned\nby users": degree(mentioned_by, u),
+                    "Mutual\nmentions": mutual(mentions, u),
+                    "Users\nreplied to": degree(replies, u),
+                    "Replied to\nby users": degree(replied_to_by, u),
+                    "Mutual\nreplies": mutual(replies, u),
+                })
+            return table
+
+    def partners_table(self, id, rows):
+        """Return a table with a line for each of the users a user interacts with the most."""
+        with self.lock:
+            mentions, replies = self.graph("mentions"), self.graph("replies")
+            partners = Counter()
+            for graph in (mentions, self.graph("mentions", reverse=True), replies, self.graph("replies", reverse=True)):
+                partners.update(neighbors(graph, id))
+            partners.pop(id, None)
+            table = []
+            for i, (v, total) in enumerate(heapq.nlargest(rows, partners.items(), key=lambda x: x[1])):
+                table.append({
+                    "Rank": f"#{i+1}",
+                    "User": self.name(v),
+                    "Mentioned": edge_weight(mentions, id, v),
+                    "Mentioned\nby": edge_weight(mentions, v, id),
+                    "Replied": edge_weight(replies, id, v),
+                    "Replied\nto by": edge_weight(replies, v, id),
+                    "Interactions": total,
+                })
+            return table
+
+    def ranks(self, info, ranks):
+        """Return a table with a line for each rank and a column for each server or channel rank metric."""
+        with self.lock:
+            info = self.view(info)
+            overall = self.overall_ranking(info)
+            cell = lambda keys, i: self.name(keys[i]) if len(keys) > i else "-"
+            ranked = lambda field, i: cell(self.ranking(info[field]), i)
+            table = []
+            rows = min(10, max((len(info["emoji"]), len(overall), len(info["reactions_received"]))))
+            for i in range(rows):
+                line = {
+                    "Rank": f"#{i+1}",
+                    "Message\nsender": ranked("messages", i),
+                    "Character\ntyper": ranked("chars_typed", i),
+                    "Emoji\nused": ranked("emoji", i),
+                    "Reaction": ranked("reactions", i),
+                    "Overall\nemoji": cell(overall, i),
+                    "Mentioner": ranked("mentions", i),
+                    "Mentioned": ranked("mentioned", i),
+                    "Replier": ranked("replies", i),
+                    "Replied\nto": ranked("replied_to", i),
+                    "Link\nsender": ranked("links", i),
+                    "Attachment\ntype": self.attachment_types(info)[i] if len(self.attachment_types(info)) > i else "-",
+                    "Attachment\nsender": cell(self.attachment_senders(info), i),
+                }
+                table.append(filter_dict(line, ["Rank"]+ranks))
+            return table
+
+    def emoji_table(self, rows):
+        """Return a table with a line for each ranked emoji and a column for each emoji metric."""
+        with self.lock:
+            label = self.label
+            emoji = self.cached("emoji", lambda emoji: {e: self.view(info) for e, info in emoji.items()}, self.data["emoji"])
+            ranked = self.cached("emoji ranking", lambda emoji: sorted(emoji, key=lambda e: total(emoji[e], "in_message") + total(emoji[e], "reactions_given"), reverse=True), emoji)
+            table = []
+            for i, e in enumerate(ranked[:rows]):
+                info = emoji[e]
+                table.append({
+                    "Rank": f"#{i+1}",
+                    "Emoji": self.name(e),
+                    "Times used\nin messages": total(info, "in_message"),
+                    "Top user\nin messages": label(info, ["in_message"], max_value(info["in_message"])) if info["in_message"] else "-",
+                    "Times used\nas reaction": total(info, "reactions_given"),
+                    "Top user\nas reaction": label(info, ["reactions_given"], max_value(info["reactions_given"])) if info["reactions_given"] else "-",
+                    "Top receiver\nas reaction": label(info, ["reactions_received"], max_value(info["reactions_received"])) if info["reactions_received"] else "-",
+                    "Times used\noverall": total(info, "in_message") + total(info, "reactions_given"),
+                    "Top user\noverall": label(info, ["in_message", "reactions_given"], max_value(add_dicts(info["in_message"], info["reactions_given"]))) if info["in_message"] or info["reactions_given"] else "-",
+                })
+            return table
+
+    def hours(self, info):
+        """Return the amount of messages per hour of the day, labeled in the time format of the analysis."""
+        with self.lock:
+            active_hours = {f"{h}h": v for h, v in enumerate(info["active_hours"])}
+        if self.time_format == "12h":
+            convert_format = lambda h: datetime.strptime(h.replace("h", ""), "%H").strftime("%-I %p")
+            active_hours = {convert_format(h): v for h, v in active_hours.items()}
+        return active_hours
+
+    def days(self, info):
+        """Return the amount of messages per day of the week."""
+        with self.lock:
+            return dict(zip(week_days, info["active_days"]))
+
+
+###########
+# Reports #
+###########
+
+def page_path(kind, name):
+    """Return the path of a channel or user report page, without extension, relative to the report directory."""
+    safe_name = re.sub(r"[^\w-]", "_", name)
+    digest = hashlib.blake2b(name.encode(), digest_size=4).hexdigest()
+    return f"{kind}s/{safe_name}-{digest}"
+
+def report_pages(analysis):
+    """Return the kind, key and path of every page of a report on an `Analysis`."""
+    pages = [("index", None, "index"), ("users", None, "users"), ("channels", None, "channels"), ("emoji", None, "emoji"), ("interactions", None, "interactions")]
+    pages += [("channel", c, page_path("channel", c)) for c in analysis.data["channels"]]
+    pages += [("user", u, page_path("user", analysis.name(u))) for u in analysis.data["users"]]
+    return pages
+
+def page_inputs(analysis, kind, key, options):
+    """Return the parts of the analysis a report page depends on, with user names and emoji in place of their index."""
+    data, name = analysis.data, analysis.name
+    if kind == "user":
+        partners = {f: neighbors(analysis.graph(given, reverse=True), key) for f, given in reverse_fields.items()}
+        return [name(key), translate({**data["users"][key], **analysis.received(key)}, user_sketches, name), translate(partners, user_sketches, name)]
+    if kind == "channel":
+        return [key, translate(data["channels"][key], channel_counters, name)]
+    if kind == "index":
+        return [data["timezone"], data.get("estimated", False), translate(data["server"], channel_counters, name), list(data["channels"]), [name(u) for u in data["users"]]]
+    if kind == "users":
+        roles = {r: [name(u) for u in members] for r, members in data["roles"].items()}
+        return [options["role_filter"], roles, {name(u): translate(info, user_sketches, name) for u, info in data["users"].items()}]
+    if kind == "channels":
+        return {c: translate(info, channel_counters, name) for c, info in data["channels"].items()}
+    if kind == "emoji":
+        return [options["emoji_rows"], {name(e): translate(info, emoji_sketches, name) for e, info in data["emoji"].items()}]
+    if kind == "interactions":
+        roles = {r: [name(u) for u in members] for r, members in data["roles"].items()}
+        users = {name(u): translate(filter_dict(analysis.view(info), reverse_fields.values()), user_sketches, name) for u, info in data["users"].items()}
+        return [options["interaction_rows"], options["role_filter"], roles, users]
+
+def page_sections(analysis, kind, key, options):
+    """Return the title of a report page and its sections as (heading, type, content) tuples."""
+    data = analysis.data
+    if kind == "users":
+        return "Users", [("Metrics", "table", analysis.users_table(user_metrics, options["role_filter"]))]
+    if kind == "channels":
+        return "Channels", [("Metrics", "table", analysis.channels_table(channel_metrics))]
+    if kind == "emoji":
+        return "Emoji", [("Ranks", "table", analysis.emoji_table(options["emoji_rows"]))]
+    if kind == "interactions":
+        reciprocity = [("Mentions", "{:.1%}".format(analysis.reciprocity("mentions"))), ("Replies", "{:.1%}".format(analysis.reciprocity("replies")))]
+        return "Interactions", [
+            ("Top pairs", "table", analysis.pairs_table(options["interaction_rows"])),
+            ("Reciprocity", "metrics", reciprocity),
+            ("Degrees", "table", analysis.degrees_table(options["role_filter"])),
+        ]
+    if kind == "user":
+        info = data["users"][key]
+        title, metrics, ranks_table = f"User: {analysis.name(key)}", analysis.user_metrics(key), analysis.user_ranks(key)
+    else:
+        info = data["server"] if kind == "index" else data["channels"][key]
+        title = f"Server: {data['server']['name']}" if kind == "index" else f"Channel: {key}"
+        metrics, ranks_table = analysis.metrics(info), analysis.ranks(info, ranks)
+    sections = [
+        ("Metrics", "metrics", metrics),
+        ("Ranks", "table", ranks_table),
+        (f"Active hours of the day (timezone: {data['timezone']})", "chart", analysis.hours(info)),
+        (f"Active days of the week (timezone: {data['timezone']})", "chart", analysis.days(info)),
+    ]
+    if kind == "user":
+        sections.insert(2, ("Interactions", "table", analysis.partners_table(key, options["interaction_rows"])))
+    if kind == "index":
+        overview = [("Scanned channels", len(data["channels"]))]
+        if data.get("estimated"):
+            overview.append(("Counts", "estimated from a sampled scan"))
+        pages = [(f"Channel: {key}" if k == "channel" else f"User: {analysis.name(key)}" if k == "user" else k.capitalize(), f"{path}.{options['format']}") for k, key, path in report_pages(analysis)[1:]]
+        sections = [("Overview", "metrics", overview)] + sections + [("Pages", "links", pages)]
+    return title, sections
+
+def format_section(kind, content, options):
+    """Return the content of a report page section as text."""
+    if kind == "table":
+        return tabulate(content, tablefmt=options["table_format"], headers="keys")
+    if kind == "chart":
+        return format_bar_chart(content)
+    return "\n".join(f"{name}: {value}" for name, value in content)
+
+def format_page(title, sections, options):
+    """Return a report page as text or HTML."""
+    if options["format"] == "txt":
+        return "\n\n".join([title] + [f"{heading}\n\n{format_section(kind, content, options)}" for heading, kind, content in sections]) + "\n"
+    body = []
+    for heading, kind, content in sections:
+        body.append(f"<h2>{escape(heading)}</h2>")
+        if kind == "table":
+            body.append(tabulate(content, tablefmt="html", headers="keys"))
+        elif kind == "links":
+            body.append("<ul>\n" + "\n".join(f'<li><a href="{escape(path)}">{escape(name)}</a></li>' for name, path in content) + "\n</ul>")
+        else:
+            body.append(f"<pre>{escape(format_section(kind, content, options))}</pre>")
+    return f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{escape(title)}</title></head>\n<body>\n<h1>{escape(title)}</h1>\n' + "\n".join(body) + "\n</body>\n</html>\n"
+
+def init_report_worker(data, options):
+    """Load the analysis data and report options in a worker process."""
+    global report_worker
+    report_worker = (Analysis(data, options["time_format"], options["repeat_emoji"], options["legacy_replies"]), options)
+
+def write_page(page):
+    """Render a report page in a worker process and write it to its path."""
+    kind, key, path = page
+    analysis, options = report_worker
+    try:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(format_page(*page_sections(analysis, kind, key, options), options))
+    except OSError as e:
+        print(e)
 
+def generate_report(analysis, directory, options):
+    """Render every page of a report on an `Analysis` to `directory` in parallel. Pages whose inputs have not changed since
+    the last report, according to the digests kept in `report_cache.json`, are skipped. Return the number of pages rendered and skipped."""
+    options = dict(options, time_format=analysis.time_format, repeat_emoji=analysis.repeat_emoji, legacy_replies=analysis.legacy_replies)
+    cache_path = join(directory, "report_cache.json")
+    cache = import_file(cache_path) if isfile(cache_path) else {}
+    digests, pages = {}, []
+    with analysis.lock:
+        for kind, key, name in report_pages(analysis):
+            file = f"{name}.{options['format']}"
+            inputs = json.dumps([version, options, kind, page_inputs(analysis, kind, key, options)], sort_keys=True)
+            digests[file] = hashlib.blake2b(inputs.encode()).hexdigest()
+            if cache.get(file) != digests[file] or not isfile(join(directory, file)):
+                pages.append((kind, key, join(directory, file)))
+        if pages:
+            for d in {dirname(path) for kind, key, path in pages}:
+                makedirs(d, exist_ok=True)
+            with ProcessPoolExecutor(initializer=init_report_worker, initargs=(analysis.data, options)) as executor:
+                list(executor.map(write_page, pages, chunksize=16))
+    for file in set(cache) - set(digests):
+        if isfile(join(directory, file)):
+            remove(join(directory, file))
+    try:
+        with open(cache_path, "w") as file:
+            json.dump(digests, file)
+    except OSError as e:
+        print(e)
+    return len(pages), len(digests) - len(pages)
 
 ##########
 # Events #
@@ -603,32 +1875,66 @@ def get_emoji_table(rows):
 
 @client.event
 async def on_ready():
+    global analysis
     print(f"Logged in as {client.user}")
     try:
-        if update:
+        if scan and mode != "New scan":
             server = client.get_guild(scan["server"]["id"])
         else:
             print("\nSelect a server:")
             server = select(client.guilds, key=lambda s: s.name)
-        await scan_server(server, update=update)
-        print("Analyzing scan...", " "*16)
-        analyze_scan()
+        if mode == "Live analysis":
+            await live_server(server)
+        elif mode == "Refresh reactions":
+            await refresh_reactions(server)
+        else:
+            await scan_server(server, update=mode == "Update scan")
+            print("Analyzing scan...", " "*16)
+            analysis = Analysis(analyze_scan(scan, settings), **display)
     except KeyboardInterrupt:
         await client.close()
         print()
 
+@client.event
+async def on_message(message):
+    if live_events and str(message.channel.id) in live_channels:
+        raw = await raw_message(message)
+        await live_events.put({"type": "message", "channel_id": str(message.channel.id), "channel": message.channel.name, "id": message.id, "message": extract_features(raw), "raw": raw})
+
+async def put_reaction_event(kind, payload):
+    """Queue a reaction added or removed in a followed channel. Raw reaction events are used because the other ones only
+    arrive for the messages discord.py keeps in memory, which do not include the scanned ones."""
+    channel = client.get_channel(payload.channel_id)
+    if not (live_events and channel and str(channel.id) in live_channels):
+        return
+    try:
+        message = discord.utils.get(client.cached_messages, id=payload.message_id) or await channel.fetch_message(payload.message_id)
+        user = payload.member or client.get_user(payload.user_id) or await client.fetch_user(payload.user_id)
+    except discord.HTTPException:
+        return
+    await live_events.put({"type": kind, "channel_id": str(channel.id), "channel": channel.name, "id": message.id, "timestamp": str(message.created_at), "author": message.author.name, "emoji": payload.emoji.name, "user": user.name, "raw": await raw_message(message, {})})
+
+@client.event
+async def on_raw_reaction_add(payload):
+    await put_reaction_event("reaction_add", payload)
+
+@client.event
+async def on_raw_reaction_remove(payload):
+    await put_reaction_event("reaction_remove", payload)
+
 
 #############
 # Main loop #
 #############
 
 def main():
-    global scan, analysis, update, always_show, always_reanalyze, table_format, time_format, repeat_emoji, legacy_replies, timezone
+    global scan, analysis, mode, live_events, always_show, always_reanalyze, table_format, cache_dir
     
     options = {}
     menu = ["Home"]
     role_filter = ["@everyone"]
     emoji_rows = 20
+    chart_rows = 20
     
     try:
         while True:
@@ -644,20 +1950,23 @@ def main():
             elif menu[-1] == "Back":
                 menu.pop()
             elif menu[-1] == "Home":
-                scan_options = {"u": "Update scan", "e": "Export scan"} if scan else {}
-                analysis_options = {"x": "Export analysis", "v": "View analysis"} if analysis else {}
+                scan_options = {"u": "Update scan", "r": "Refresh reactions", "e": "Export scan"} if scan else {}
+                analysis_options = {"x": "Export analysis", "v": "View analysis", "g": "Generate report"} if analysis else {}
                 options = {
                     "n": "New scan",
                     "i": "Import scan",
+                    "w": "Rebuild scan from cache",
                     **scan_options,
+                    "l": "Live analysis",
                     "m": "Import analysis",
                     **analysis_options,
+                    "c": "Combine files",
                     "s": "Settings",
                     "a": "About",
                     "q": "Quit"
                 }
-            elif menu[-1] in ("New scan", "Update scan"):
-                update = menu[-1] == "Update scan"
+            elif menu[-1] in ("New scan", "Update scan", "Live analysis", "Refresh reactions"):
+                mode = menu[-1]
                 while not client.user:
                     try:
                         print("Enter your token (see https://github.com/rodrigohpalmeirim/discord-analyzer/wiki/Obtaining-Token)")
@@ -669,52 +1978,126 @@ def main():
                         client.loop.run_until_complete(client.close())
                         print(e)
                 client.clear()
-                client.loop.run_until_complete(client.connect()) # will trigger on_ready event and block until connection is closed
+                try:
+                    client.loop.run_until_complete(client.connect()) # will trigger on_ready event and block until connection is closed
+                except KeyboardInterrupt:
+                    if mode != "Live analysis" or not live_events:
+                        raise
+                    print()
+                    client.loop.run_until_complete(client.close())
+                    export_snapshot(analysis, scan, live_snapshot)
+                    live_events = None
             elif menu[-1] == "Import scan":
-                print("Enter scan file path")
-                new_scan = import_file(input("> "), scan_version)
-                if new_scan:
-                    scan = new_scan
+                print("Enter scan file or directory path")
+                path = input("> ")
+                if isdir(path):
                     print("Analyzing scan...")
-                    analyze_scan()
+                    new_scan, imported = import_sharded_scan(path, settings)
+                    if new_scan:
+                        scan = new_scan
+                        analysis = Analysis(imported, **display)
+                else:
+                    new_scan = import_file(path, scan_version)
+                    if new_scan:
+                        scan = new_scan
+                        print("Analyzing scan...")
+                        analysis = Analysis(analyze_scan(scan, settings), **display)
+            elif menu[-1] == "Rebuild scan from cache":
+                print(f"Enter raw message cache directory (default: '{cache_dir or 'cache'}')")
+                directory = input("> ") or cache_dir or "cache"
+                servers = {}
+                for d in (listdir(directory) if isdir(directory) else []):
+                    info = read_cache_info(join(directory, d))
+                    if info:
+                        servers[join(directory, d)] = info["server"]["name"]
+                if not servers:
+                    print("No cached servers found")
+                else:
+                    print("Select a server:")
+                    rebuilt = rebuild_scan(select(servers, key=servers.get))
+                    if rebuilt:
+                        scan = rebuilt
+                        print("Analyzing scan...")
+                        analysis = Analysis(analyze_scan(scan, settings), **display)
             elif menu[-1] == "Export scan":
+                print("Select a format:")
+                sharded = select(["Single file", "Directory with one file per channel"]) != "Single file"
                 print("Enter scan name (default: 'scan')")
-                filename = input("> ")
-                filename = filename + ".json" if filename else "scan.json"
-                export(scan, filename)
+                filename = input("> ") or "scan"
+                if sharded:
+                    written = export_sharded_scan(scan, filename)
+                    print(f"Wrote {written} of {len(scan['channels'])} channel files ({len(scan['channels']) - written} unchanged)")
+                else:
+                    export(scan, filename + ".json")
             elif menu[-1] == "Import analysis":
                 print("Enter analysis file path")
-                new_analysis = import_file(input("> "), analysis_version)
-                if new_analysis:
-                    analysis = new_analysis
+                imported = import_file(input("> "))
+                imported = read_analysis(imported) if imported else None
+                if imported:
+                    analysis = Analysis(imported, **display)
                     scan = None
+            elif menu[-1] == "Combine files":
+                print("Enter scan or analysis file paths (one per line, empty line to finish)")
+                paths = []
+                while True:
+                    path = input("> ")
+                    if not path: break
+                    paths.append(path)
+                if paths:
+                    print("Analyzing files...")
+                    combined = combine_files(paths, settings)
+                    if combined:
+                        analysis = Analysis(combined, **display)
+                        scan = None
             elif menu[-1] == "Export analysis":
                 print("Enter analysis name (default: 'analysis')")
                 filename = input("> ")
                 filename = filename + ".json" if filename else "analysis.json"
-                export(analysis, filename)
+                export_analysis(analysis.data, filename)
+            elif menu[-1] == "Generate report":
+                print("Enter report directory (default: 'report')")
+                directory = input("> ") or "report"
+                print("Select a format:")
+                report_format = select(["Text", "HTML"])
+                report_options = {"format": "html" if report_format == "HTML" else "txt", "table_format": table_format, "role_filter": role_filter, "emoji_rows": emoji_rows, "interaction_rows": chart_rows}
+                print("Rendering report...")
+                rendered, skipped = generate_report(analysis, directory, report_options)
+                print(f"Rendered {rendered} pages to '{directory}' ({skipped} unchanged)")
             elif menu[-1] == "Settings":
                 options = {
-                    "t": f"Time display format [current: {time_format}]",
-                    "a": f"Analysis timezone [current: {timezone}]",
-                    "r": f"Count repeated emoji in same message [current: {repeat_emoji}]",
-                    "q": f"Count quotes followed by a tag as replies [current: {legacy_replies}]",
+                    "t": f"Time display format [current: {display['time_format']}]",
+                    "a": f"Analysis timezone [current: {settings['timezone']}]",
+                    "r": f"Count repeated emoji in same message [current: {display['repeat_emoji']}]",
+                    "q": f"Count quotes followed by a tag as replies [current: {display['legacy_replies']}]",
+                    "m": f"Approximate analysis with bounded memory [current: {settings['approximate']}]",
+                    "c": f"Raw message cache directory [current: {cache_dir or 'disabled'}]",
                     "b": "Back",
                 }
             elif menu[-1].startswith("Time display format"):
-                time_format = "12h" if time_format == "24h" else "24h"
+                display["time_format"] = "12h" if display["time_format"] == "24h" else "24h"
+                if analysis:
+                    analysis.time_format = display["time_format"]
             elif menu[-1].startswith("Analysis timezone"):
-                timezone = select(pytz.common_timezones)
+                settings["timezone"] = select(pytz.common_timezones)
                 reanalyze_prompt()
             elif menu[-1].startswith("Count repeated emoji in same message"):
-                repeat_emoji = not repeat_emoji
-                reanalyze_prompt()
+                display["repeat_emoji"] = not display["repeat_emoji"]
+                switch_variant("repeat_emoji")
             elif menu[-1].startswith("Count quotes followed by a tag as replies"):
-                legacy_replies = not legacy_replies
+                display["legacy_replies"] = not display["legacy_replies"]
+                switch_variant("legacy_replies")
+            elif menu[-1].startswith("Approximate analysis with bounded memory"):
+                settings["approximate"] = not settings["approximate"]
                 reanalyze_prompt()
+            elif menu[-1].startswith("Raw message cache directory"):
+                print("Enter the directory where scans record the raw messages fetched (empty to disable)")
+                cache_dir = input("> ") or None
             elif menu[-1] == "View analysis":
-                print("Server:", analysis["server"]["name"])
-                print("Scanned channels:", len(analysis["channels"]), end="\n\n")
+                print("Server:", analysis.data["server"]["name"])
+                print("Scanned channels:", len(analysis.data["channels"]))
+                if analysis.data.get("estimated"):
+                    print("Counts are estimated from a sampled scan")
+                print()
                 options = {
                     "u": "Users analysis",
                     "e": "Emoji analysis",
@@ -726,6 +2109,7 @@ def main():
                 if menu[-1] == "Users analysis":
                     options = {
                         "m": "Metrics analysis",
+                        "i": "Interactions analysis",
                         "s": "Specific user analysis",
                         "b": "Back",
                     }
@@ -740,46 +2124,66 @@ def main():
                         "o": "Overview",
                         "c": "Custom",
                         "s": "Specific metric chart",
+                        "d": "Metric distribution chart",
                         "f": "Set role filter",
                         "b": "Back",
                     }
                 elif menu[-1] == "Messages":
-                    show_table(get_users_table(user_metrics[:3], role_filter))
+                    show_table(analysis.users_table(user_metrics[:3], role_filter))
                 elif menu[-1] == "Emoji":
-                    show_table(get_users_table(user_metrics[3:10], role_filter))
+                    show_table(analysis.users_table(user_metrics[3:10], role_filter))
                 elif menu[-1] == "Replies and mentions":
-                    show_table(get_users_table(user_metrics[10:14], role_filter))
+                    show_table(analysis.users_table(user_metrics[10:14], role_filter))
                 elif menu[-1] == "Links and attachments":
-                    show_table(get_users_table(user_metrics[14:17], role_filter))
+                    show_table(analysis.users_table(user_metrics[14:17], role_filter))
                 elif menu[-1] == "Overview":
                     metrics = ["Messages", "Characters\nper message", "Top overall\nemoji", "Top reaction\nreceived", "Mentions", "Times\nmentioned", "Replies", "Times\nreplied to", "Links", "Attachments"]
-                    show_table(get_users_table(metrics, role_filter))
+                    show_table(analysis.users_table(metrics, role_filter))
                 elif menu[-1] == "Custom":
-                    show_table(get_users_table(multi_select(user_metrics), role_filter))
+                    show_table(analysis.users_table(multi_select(user_metrics), role_filter))
                 elif menu[-1] == "Specific metric chart":
-                    metric = select(["Messages", "Characters\ntyped", "Characters\nper message", "Emoji\nused", "Reactions", "Reactions\nreceived", "Mentions", "Times\nmentioned", "Replies", "Times\nreplied to", "Links", "Attachments"])
-                    bar_chart({e["User"]: e[metric] for e in get_users_table([metric], role_filter) if e[metric] != "-"}, sort=True)
+                    metric = select(user_chart_metrics)
+                    bar_chart({e["User"]: e[metric] for e in analysis.users_table([metric], role_filter) if e[metric] != "-"}, sort=True, top=chart_rows, others=metric != "Characters\nper message")
+                elif menu[-1] == "Metric distribution chart":
+                    metric = select(user_chart_metrics)
+                    print("Users per range of", metric.replace("\n", " ").lower(), end="\n\n")
+                    bar_chart(histogram(e[metric] for e in analysis.users_table([metric], role_filter) if e[metric] != "-"))
                 elif menu[-1] == "Set role filter":
-                    role_filter = multi_select(analysis["roles"])
+                    role_filter = multi_select(analysis.data["roles"])
+                elif menu[-1] == "Interactions analysis":
+                    options = {
+                        "p": "Top pairs",
+                        "d": "Degrees and reciprocity",
+                        "b": "Back",
+                    }
+                elif menu[-1] == "Top pairs":
+                    show_table(analysis.pairs_table(chart_rows))
+                elif menu[-1] == "Degrees and reciprocity":
+                    print("Reciprocity of mentions: {:.1%}".format(analysis.reciprocity("mentions")))
+                    print("Reciprocity of replies: {:.1%}".format(analysis.reciprocity("replies")), end="\n\n")
+                    show_table(analysis.degrees_table(role_filter))
                 elif menu[-1] == "Specific user analysis":
                     if not selected_user:
-                        selected_user = select(analysis["users"].keys())
-                    print("Selected user:", selected_user, end="\n\n")
+                        selected_user = select(analysis.data["users"].keys(), key=analysis.name)
+                    print("Selected user:", analysis.name(selected_user), end="\n\n")
                     options = {
                         "m": "Metrics",
                         "r": "Ranks",
+                        "i": "Interactions",
                         "h": "Active hours of the day",
                         "d": "Active days of the week",
                         "b": "Back",
                     }
                 elif menu[-1] == "Metrics":
-                    show_user_metrics(selected_user)
+                    show_metrics(analysis.user_metrics(selected_user))
                 elif menu[-1] == "Ranks":
-                    show_table(get_user_ranks(selected_user))
+                    show_table(analysis.user_ranks(selected_user))
+                elif menu[-1] == "Interactions":
+                    show_table(analysis.partners_table(selected_user, chart_rows))
                 elif menu[-1] == "Active hours of the day":
-                    show_hours(analysis["users"][selected_user], time_format)
+                    show_hours(analysis, analysis.data["users"][selected_user])
                 elif menu[-1] == "Active days of the week":
-                    show_days(analysis["users"][selected_user])
+                    show_days(analysis, analysis.data["users"][selected_user])
             elif "Emoji analysis" in menu:
                 if menu[-1] == "Emoji analysis":
                     options = {
@@ -789,15 +2193,15 @@ def main():
                         "b": "Back",
                     }
                 elif menu[-1] == "Ranks":
-                    show_table(get_emoji_table(emoji_rows))
+                    show_table(analysis.emoji_table(emoji_rows))
                 elif menu[-1] == "Specific emoji analysis":
                     print("Enter an emoji")
-                    e = input("> ")
+                    e = analysis.data["ids"].get(input("> "))
                     print()
-                    if e not in analysis["emoji"]:
+                    if e not in analysis.data["emoji"]:
                         print("Emoji not found")
                     else:
-                        show_emoji_metrics(analysis["emoji"][e])
+                        show_metrics(analysis.emoji_metrics(analysis.data["emoji"][e]))
                 elif menu[-1].startswith("Set rank rows"):
                     print("Enter number of rows")
                     while True:
@@ -826,25 +2230,25 @@ def main():
                             "b": "Back",
                         }
                     elif menu[-1] == "Messages":
-                        show_table(get_channels_table(channel_metrics[:5]))
+                        show_table(analysis.channels_table(channel_metrics[:5]))
                     elif menu[-1] == "Emoji":
-                        show_table(get_channels_table(channel_metrics[5:10]))
+                        show_table(analysis.channels_table(channel_metrics[5:10]))
                     elif menu[-1] == "Replies and mentions":
-                        show_table(get_channels_table(channel_metrics[10:16]))
+                        show_table(analysis.channels_table(channel_metrics[10:16]))
                     elif menu[-1] == "Links and attachments":
-                        show_table(get_channels_table(channel_metrics[16:21]))
+                        show_table(analysis.channels_table(channel_metrics[16:21]))
                     elif menu[-1] == "Overview":
                         metrics = ["Messages", "Characters\ntyped", "Characters\nper message", "Top overall\nemoji", "Mentions", "Replies", "Links", "Attachments"]
-                        show_table(get_channels_table(metrics))
+                        show_table(analysis.channels_table(metrics))
                     elif menu[-1] == "Custom":
-                        show_table(get_channels_table(multi_select(channel_metrics)))
+                        show_table(analysis.channels_table(multi_select(channel_metrics)))
                     elif menu[-1] == "Specific metric chart":
                         metric = select(["Messages", "Characters\ntyped", "Characters\nper message", "Emoji\nused", "Reactions", "Mentions", "Replies", "Links", "Attachments"])
-                        bar_chart({e["Channel"]: e[metric] for e in get_channels_table([metric]) if e[metric] != "-"}, sort=True)
+                        bar_chart({e["Channel"]: e[metric] for e in analysis.channels_table([metric]) if e[metric] != "-"}, sort=True, top=chart_rows, others=metric != "Characters\nper message")
                 elif "Specific channel analysis" in menu:
                     if menu[-1] == "Specific channel analysis":
                         if not selected_channel:
-                            selected_channel = select(analysis["channels"].keys())
+                            selected_channel = select(analysis.data["channels"].keys())
                         print("Selected channel:", selected_channel, end="\n\n")
                         options = {
                             "m": "Metrics",
@@ -854,7 +2258,7 @@ def main():
                             "b": "Back",
                         }
                     elif menu[-1] == "Metrics":
-                        show_metrics(analysis["channels"][selected_channel])
+                        show_metrics(analysis.metrics(analysis.data["channels"][selected_channel]))
                     elif menu[-1] == "Ranks":
                         print("Selected channel:", selected_channel, end="\n\n")
                         options = {
@@ -867,21 +2271,21 @@ def main():
                             "b": "Back",
                         }
                     elif menu[-1] == "Messages":
-                        show_table(get_ranks(analysis["channels"][selected_channel], ranks[:2]))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], ranks[:2]))
                     elif menu[-1] == "Emoji":
-                        show_table(get_ranks(analysis["channels"][selected_channel], ranks[2:5]))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], ranks[2:5]))
                     elif menu[-1] == "Replies and mentions":
-                        show_table(get_ranks(analysis["channels"][selected_channel], ranks[5:9]))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], ranks[5:9]))
                     elif menu[-1] == "Links and attachments":
-                        show_table(get_ranks(analysis["channels"][selected_channel], ranks[9:12]))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], ranks[9:12]))
                     elif menu[-1] == "All":
-                        show_table(get_ranks(analysis["channels"][selected_channel], ranks))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], ranks))
                     elif menu[-1] == "Custom":
-                        show_table(get_ranks(analysis["channels"][selected_channel], multi_select(ranks)))
+                        show_table(analysis.ranks(analysis.data["channels"][selected_channel], multi_select(ranks)))
                     elif menu[-1] == "Active hours of the day":
-                        show_hours(analysis["channels"][selected_channel], time_format)
+                        show_hours(analysis, analysis.data["channels"][selected_channel])
                     elif menu[-1] == "Active days of the week":
-                        show_days(analysis["channels"][selected_channel])
+                        show_days(analysis, analysis.data["channels"][selected_channel])
             elif "Server analysis" in menu:
                 if menu[-1] == "Server analysis":
                     options = {
@@ -892,7 +2296,7 @@ def main():
                         "b": "Back",
                     }
                 elif menu[-1] == "Metrics":
-                    show_metrics(analysis["server"])
+                    show_metrics(analysis.metrics(analysis.data["server"]))
                 elif menu[-1] == "Ranks":
                     options = {
                         "m": "Messages",
@@ -904,21 +2308,21 @@ def main():
                         "b": "Back",
                     }
                 elif menu[-1] == "Messages":
-                    show_table(get_ranks(analysis["server"], ranks[:2]))
+                    show_table(analysis.ranks(analysis.data["server"], ranks[:2]))
                 elif menu[-1] == "Emoji":
-                    show_table(get_ranks(analysis["server"], ranks[2:5]))
+                    show_table(analysis.ranks(analysis.data["server"], ranks[2:5]))
                 elif menu[-1] == "Replies and mentions":
-                    show_table(get_ranks(analysis["server"], ranks[5:9]))
+                    show_table(analysis.ranks(analysis.data["server"], ranks[5:9]))
                 elif menu[-1] == "Links and attachments":
-                    show_table(get_ranks(analysis["server"], ranks[9:12]))
+                    show_table(analysis.ranks(analysis.data["server"], ranks[9:12]))
                 elif menu[-1] == "All":
-                    show_table(get_ranks(analysis["server"], ranks))
+                    show_table(analysis.ranks(analysis.data["server"], ranks))
                 elif menu[-1] == "Custom":
-                    show_table(get_ranks(analysis["server"], multi_select(ranks)))
+                    show_table(analysis.ranks(analysis.data["server"], multi_select(ranks)))
                 elif menu[-1] == "Active hours of the day":
-                    show_hours(analysis["server"], time_format)
+                    show_hours(analysis, analysis.data["server"])
                 elif menu[-1] == "Active days of the week":
-                    show_days(analysis["server"])
+                    show_days(analysis, analysis.data["server"])
 
             if not options:
                 menu.pop()